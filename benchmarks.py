@@ -0,0 +1,539 @@
+"""Proste benchmarki wydajnosci modeli SciHlp.
+
+Uruchomienie: python benchmarks.py
+"""
+import collections
+import http.server
+import json
+import os
+import tempfile
+import threading
+import time
+import timeit
+import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import requests
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from scihlp import (UserModel, JournalStorage, SqliteStorage, Task, TaskModel, VirtualListbox,
+                    PlotModel, SampleCache, WeatherModel, WeatherCacheStore, WeatherHistory, WeatherPoller,
+                    downsample, rolling_mean, available_backends, compile_expression, compile_normalized_expression,
+                    normalize_expression, decimate_minmax)
+
+
+def bench_login(sizes=(10, 1000, 100000, 1000000), repeat=10000):
+
+    with tempfile.TemporaryDirectory() as tmp:
+        model = UserModel(os.path.join(tmp, "data.json"))
+
+        print("login latency vs number of users")
+        for size in sizes:
+            model.data = {
+                "users": [
+                    {"login": f"user{i}", "password": "secret", "email": f"user{i}@example.com", "tasks": []}
+                    for i in range(size)
+                ]
+            }
+            model.rebuild_user_index()
+            last_login = f"user{size - 1}"
+
+            seconds = timeit.timeit(lambda: model.authenticate_user(last_login, "secret"), number=repeat)
+            print(f"  {size:>9} users: {seconds / repeat * 1e6:8.3f} us per login")
+
+
+def bench_tasks(count=100000, repeat=100):
+
+    with tempfile.TemporaryDirectory() as tmp:
+        model = UserModel(os.path.join(tmp, "data.json"))
+        model.authenticate_user("admin", "admin")
+        # zapis na dysk nie jest tu mierzony
+        model.commit_changes = lambda changes: None
+        tasks = TaskModel(model)
+        for i in range(count):
+            tasks.add_new_task(f"task {i}", tags=[f"tag{i % 100}"], due=f"2024-{i % 12 + 1:02d}-01")
+        for task_id in range(3, count, 10):
+            tasks.mark_task_as_done(task_id)
+        legacy = [str(task) for task in tasks.get_all_tasks()]
+        last_id = tasks.get_all_tasks()[-1].id
+
+        print(f"task filtering, {count} tasks")
+        cases = [
+            ("done, [DONE] prefix scan", lambda: [task for task in legacy if task.startswith("[DONE] ")]),
+            ("done, status index", lambda: tasks.get_tasks(status="done")),
+            ("tag, substring scan", lambda: [task for task in legacy if "#tag7 " in task]),
+            ("tag, tag index", lambda: tasks.get_tasks(tag="tag7")),
+            ("by id, list scan", lambda: next(t for t in tasks.get_all_tasks() if t.id == last_id)),
+            ("by id, id index", lambda: tasks.get_task(last_id)),
+        ]
+        for name, function in cases:
+            seconds = timeit.timeit(function, number=repeat)
+            print(f"  {name:<26} {seconds / repeat * 1e6:10.1f} us")
+
+
+def bench_task_search(count=100000, vocabulary=20000, repeat=200):
+
+    with tempfile.TemporaryDirectory() as tmp:
+        model = UserModel(os.path.join(tmp, "data.json"))
+        model.authenticate_user("admin", "admin")
+        model.commit_changes = lambda changes: None
+        tasks = TaskModel(model)
+        rng = np.random.default_rng(0)
+        words = [f"word{i}" for i in range(vocabulary)]
+        for picks in rng.integers(0, vocabulary, size=(count, 5)):
+            tasks.add_new_task(" ".join(words[i] for i in picks))
+
+        def scan(query):
+            return [task for task in tasks.get_all_tasks() if query in task.text.lower().split()]
+
+        print(f"task search, {count} tasks, {vocabulary} distinct words")
+        cases = [
+            ("one word, list scan", lambda: scan("word7")),
+            ("one word, inverted index", lambda: tasks.search_tasks("word7")),
+            ("AND of two words", lambda: tasks.search_tasks("word7 word8")),
+            ("OR of two words", lambda: tasks.search_tasks("word7 OR word8")),
+            ("prefix (11 words)", lambda: tasks.search_tasks("word1234*")),
+            ("is:pending + word", lambda: tasks.search_tasks("is:pending word7")),
+        ]
+        for name, function in cases:
+            seconds = timeit.timeit(function, number=repeat)
+            print(f"  {name:<26} {seconds / repeat * 1e6:10.1f} us")
+
+        start = time.perf_counter()
+        for task_id in range(1000, 2000):
+            tasks.mark_task_as_done(task_id)
+        print(f"  mark done incl. reindexing {(time.perf_counter() - start) / 1000 * 1e6:10.1f} us")
+
+
+def bench_task_list(sizes=(1000, 10000, 50000), repeat=20):
+
+    try:
+        root = tk.Tk()
+    except tk.TclError:
+        print("task list refresh: skipped, no display")
+        return
+    root.withdraw()
+
+    print("task list refresh after marking one task done")
+    for size in sizes:
+        tasks = [Task(i, f"task {i}") for i in range(size)]
+
+        # dawne TaskView.update_tasks_display: caly Listbox od nowa
+        listbox = tk.Listbox(root)
+        start = time.perf_counter()
+        for i in range(repeat):
+            tasks[i].status = "done"
+            listbox.delete(0, tk.END)
+            for task in tasks:
+                listbox.insert(tk.END, str(task))
+            root.update_idletasks()
+        full = (time.perf_counter() - start) / repeat
+        listbox.destroy()
+
+        for task in tasks:
+            task.status = "pending"
+        virtual = VirtualListbox(root)
+        virtual.set_items(list(tasks))
+        start = time.perf_counter()
+        for i in range(repeat):
+            tasks[i].status = "done"
+            virtual.set_items(list(tasks))
+            root.update_idletasks()
+        visible = (time.perf_counter() - start) / repeat
+        virtual.frame.destroy()
+
+        print(f"  {size:>6} tasks: Listbox {full * 1e3:9.2f} ms, VirtualListbox {visible * 1e3:7.3f} ms")
+
+    root.destroy()
+
+
+def bench_task_bulk(count=1000):
+
+    print(f"marking {count} tasks done, journal storage with fsync")
+    for name, bulk in (("one by one", False), ("one batch", True)):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "data.json")
+            model = UserModel(path, JournalStorage(path, compact_every=10 * count))
+            model.authenticate_user("admin", "admin")
+            tasks = TaskModel(model)
+            task_ids = [task.id for task in tasks.add_new_tasks([(f"task {i}", 0, (), None) for i in range(count)])]
+
+            start = time.perf_counter()
+            if bulk:
+                tasks.mark_tasks_as_done(task_ids)
+            else:
+                for task_id in task_ids:
+                    tasks.mark_task_as_done(task_id)
+            seconds = time.perf_counter() - start
+            print(f"  {name:<11} {seconds * 1e3:9.2f} ms")
+
+
+def bench_task_paging(users=20, tasks_per_user=50000):
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "data.db")
+        storage = SqliteStorage(path)
+        storage.save_all({"users": [
+            {"login": f"user{u}", "password": "secret", "email": f"user{u}@example.com",
+             "tasks": [Task(u * tasks_per_user + i + 1, f"task {i}") for i in range(tasks_per_user)]}
+            for u in range(users)
+        ]})
+        storage.close()
+
+        print(f"login + first screen of tasks, SQLite, {users} users x {tasks_per_user} tasks")
+        for name, limit in (("first page", 200), ("whole list", None)):
+            start = time.perf_counter()
+            model = UserModel(path, SqliteStorage(path))
+            model.authenticate_user("user0", "secret")
+            page = TaskModel(model).get_tasks(limit=limit)
+            seconds = time.perf_counter() - start
+            loaded = sum(len(user["tasks"]) for user in model.data["users"])
+            print(f"  {name:<10} {seconds * 1e3:9.2f} ms, {len(page):>6} shown, {loaded:>6} tasks in memory")
+            model.close()
+
+
+def legacy_prepare_safe_function(function_str):
+    # dawna sciezka PlotModel: podmiana nazw w tekscie + eval
+    for name in ("sin", "cos", "tan", "exp", "log", "sqrt"):
+        function_str = function_str.replace(name, "np." + name)
+    return function_str
+
+
+def bench_expressions(count=10000, distinct=100, num_points=1000):
+
+    templates = ["sin({k}*x)", "cos(x)*{k}+x**2", "sqrt(x**2+{k})", "x**3-{k}*x", "log(x**2+{k})*cos(x)"]
+    sources = [templates[i % len(templates)].format(k=i // len(templates) % distinct + 1) for i in range(count)]
+
+    start = time.perf_counter()
+    for source in sources:
+        x = np.linspace(-10, 10, num_points)
+        eval(legacy_prepare_safe_function(source), {"np": np, "x": x})
+    legacy = time.perf_counter() - start
+
+    model = PlotModel()
+    model.num_points = num_points
+    model.cache = SampleCache(0)  # mierzymy kompilacje, nie pamiec probek
+    normalize_expression.cache_clear()
+    compile_normalized_expression.cache_clear()
+    start = time.perf_counter()
+    for source in sources:
+        model.generate_function_data(source)
+    compiled = time.perf_counter() - start
+
+    print(f"{count} expressions ({distinct * len(templates)} distinct), {num_points} points each")
+    print(f"  replace + eval:      {legacy * 1e3:8.1f} ms")
+    print(f"  compiled + cached:   {compiled * 1e3:8.1f} ms ({legacy / compiled:.1f}x)")
+    print(f"  {compile_normalized_expression.cache_info()}")
+
+
+def bench_backends(lengths=(1, 2, 4, 8, 16), num_points=2000000, repeat=5):
+
+    terms = ["sin({k}*x)", "cos(x)*{k}", "exp(-x**2/{k})", "sqrt(x**2+{k})"]
+    x = np.linspace(-10, 10, num_points)
+    backends = available_backends()
+
+    print(f"throughput vs expression length, {num_points} points, M points/s (best of {repeat})")
+    print(f"  {'terms':>5} {'eval':>9}" + "".join(f" {backend:>9}" for backend in backends))
+    for length in lengths:
+        source = "+".join(terms[k % len(terms)].format(k=k + 1) for k in range(length))
+
+        legacy_source = legacy_prepare_safe_function(source)
+        seconds = min(timeit.repeat(lambda: eval(legacy_source, {"np": np, "x": x}), number=1, repeat=repeat))
+        row = f"  {length:>5} {num_points / seconds / 1e6:9.1f}"
+
+        for backend in backends:
+            function = compile_expression(source, backend=backend)
+            function(x)
+            seconds = min(timeit.repeat(lambda: function(x), number=1, repeat=repeat))
+            row += f" {num_points / seconds / 1e6:9.1f}"
+        print(row)
+
+
+def bench_plot_cache(repeat=200, num_points=100001):
+    # kilka funkcji rysowanych w kolko, czesc zapytan to przyblizenie (podzakres)
+    sources = ["sin(x)", "x**2", "exp(-x**2)*cos(5*x)", "log(x**2+1)", "sqrt(abs(x))*sin(x)"]
+    requests = []
+    for i in range(repeat):
+        source = sources[i % len(sources)]
+        if i % 3 == 2:
+            requests.append((source, -5.0, 5.0, num_points // 2 + 1))
+        else:
+            requests.append((source, -10.0, 10.0, num_points))
+
+    timings = {}
+    for name, max_bytes in (("no cache", 0), ("cache", 64 * 1024 * 1024)):
+        model = PlotModel()
+        model.cache = SampleCache(max_bytes)
+        start = time.perf_counter()
+        for source, x_min, x_max, points in requests:
+            model.generate_function_data(source, x_min=x_min, x_max=x_max, num_points=points)
+        timings[name] = time.perf_counter() - start
+        stats = model.cache.stats()
+
+    print(f"{repeat} plots of {len(sources)} functions, {num_points} points")
+    print(f"  no cache:   {timings['no cache'] / repeat * 1e3:8.3f} ms per plot")
+    print(f"  cache:      {timings['cache'] / repeat * 1e3:8.3f} ms per plot "
+          f"({timings['no cache'] / timings['cache']:.1f}x)")
+    print(f"  {stats}")
+
+
+class StubWeatherHandler(http.server.BaseHTTPRequestHandler):
+    # odpowiada jak API pogody, z opoznieniem jak przy prawdziwym serwerze
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True  # naglowki i tresc ida osobno, bez tego keep-alive czeka na ACK
+    delay = 0.01
+    calls = 0
+
+    def do_GET(self):
+        type(self).calls += 1
+        time.sleep(self.delay)
+        location = parse_qs(urlparse(self.path).query)["q"][0]
+        body = json.dumps({
+            "main": {"temp": 20.0, "humidity": 50, "pressure": 1013},
+            "wind": {"speed": 3.0},
+            "weather": [{"description": "clear sky"}],
+            "name": location
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_weather_server():
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), StubWeatherHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/weather"
+
+
+def bench_weather(count=100, cities=5, concurrent=20):
+
+    server, url = start_stub_weather_server()
+    try:
+        model = WeatherModel(api_key="stub", api_url=url, cache_ttl=0)
+        start = time.perf_counter()
+        for i in range(count):
+            requests.get(url, params={"q": f"city{i}", "appid": "stub", "units": "metric"}, timeout=5).json()
+        fresh = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for i in range(count):
+            model.fetch_weather_for_location(f"city{i}")
+        pooled = time.perf_counter() - start
+
+        print(f"weather requests against a local stub server ({StubWeatherHandler.delay * 1e3:g} ms per response)")
+        print(f"  new connection each:  {fresh / count * 1e3:8.2f} ms per request")
+        print(f"  pooled session:       {pooled / count * 1e3:8.2f} ms per request ({fresh / pooled:.1f}x)")
+
+        model = WeatherModel(api_key="stub", api_url=url)
+        for i in range(count):
+            model.fetch_weather_for_location(f"City{i % cities} ")
+        print(f"  {count} lookups of {cities} cities: {model.stats()}")
+
+        model = WeatherModel(api_key="stub", api_url=url)
+        StubWeatherHandler.calls = 0
+        with ThreadPoolExecutor(max_workers=concurrent) as executor:
+            results = list(executor.map(model.fetch_weather_for_location, ["Warsaw"] * concurrent))
+        print(f"  {concurrent} concurrent lookups of one city: {StubWeatherHandler.calls} HTTP call(s), "
+              f"{sum(result is not None for result in results)} results")
+        model.close()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def bench_weather_batch(count=500, concurrency=(1, 4, 16)):
+
+    server, url = start_stub_weather_server()
+    try:
+        print(f"batch of {count} locations against a local stub server "
+              f"({StubWeatherHandler.delay * 1e3:g} ms per response)")
+        for limit in concurrency:
+            model = WeatherModel(api_key="stub", api_url=url)
+            start = time.perf_counter()
+            first = None
+            for location, data, error in model.iter_weather_batch([f"site{i}" for i in range(count)], limit):
+                if first is None:
+                    first = time.perf_counter() - start
+            total = time.perf_counter() - start
+            print(f"  {limit:>3} in flight: first result {first * 1e3:7.1f} ms, all {total:6.2f} s")
+            model.close()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def bench_weather_restart(count=500):
+    # drugi start aplikacji: z plikiem pamieci podrecznej i bez niego
+    server, url = start_stub_weather_server()
+    locations = [f"site{i}" for i in range(count)]
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_file = os.path.join(tmp, "weather.db")
+            model = WeatherModel(api_key="stub", api_url=url, store=WeatherCacheStore(db_file))
+            for _ in model.iter_weather_batch(locations):
+                pass
+            model.close()
+
+            print(f"restart with {count} monitored locations")
+            for name, store in (("no cache file", None), ("cache file", db_file)):
+                StubWeatherHandler.calls = 0
+                start = time.perf_counter()
+                model = WeatherModel(api_key="stub", api_url=url,
+                                     store=WeatherCacheStore(store) if store else None)
+                first = None
+                for _ in model.iter_weather_batch(locations):
+                    if first is None:
+                        first = time.perf_counter() - start
+                total = time.perf_counter() - start
+                model.close()
+                print(f"  {name:<14} first row {first * 1e3:7.1f} ms, all {total * 1e3:7.1f} ms, "
+                      f"{StubWeatherHandler.calls} API calls")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def bench_weather_history(appends=5000, observations=1000000, chunk_size=4096):
+
+    with tempfile.TemporaryDirectory() as tmp:
+        history = WeatherHistory(tmp, chunk_size)
+        data = {"main": {"temp": 20.0, "humidity": 50, "pressure": 1013}, "wind": {"speed": 3.0}}
+        start = time.perf_counter()
+        for i in range(appends):
+            history.append("warsaw", dict(data, fetched_at=float(i)))
+        append = time.perf_counter() - start
+
+        # dluga historia: co 10 minut przez ~19 lat, zapisana od razu kawalkami
+        rows = np.zeros(observations, dtype=WeatherHistory.RECORD)
+        rows["time"] = 1e9 + np.arange(observations) * 600.0
+        rows["temp"] = 10 + 10 * np.sin(np.arange(observations) * 2 * np.pi / 144) + np.random.randn(observations)
+        history.extend("long", rows)
+
+        history = WeatherHistory(tmp, chunk_size)
+        start = time.perf_counter()
+        columns = history.query("long", ("time", "temp"))
+        query = time.perf_counter() - start
+
+        start = time.perf_counter()
+        rolling_mean(columns["time"], columns["temp"], 24 * 3600)
+        rolling = time.perf_counter() - start
+
+        start = time.perf_counter()
+        downsample(columns["time"], columns["temp"], 7 * 24 * 3600)
+        buckets = time.perf_counter() - start
+
+        print(f"weather history, chunks of {chunk_size}")
+        print(f"  append:                 {append / appends * 1e6:8.1f} us per observation")
+        print(f"  query {observations} rows:     {query * 1e3:8.1f} ms")
+        print(f"  24 h rolling mean:      {rolling * 1e3:8.1f} ms")
+        print(f"  weekly min/mean/max:    {buckets * 1e3:8.1f} ms")
+
+
+def bench_weather_poller(locations=200, rate_per_minute=1200, seconds=5.0):
+
+    server, url = start_stub_weather_server()
+    try:
+        calls = []
+        handler_get = StubWeatherHandler.do_GET
+
+        def counting_get(handler):
+            calls.append(time.monotonic())
+            handler_get(handler)
+
+        StubWeatherHandler.do_GET = counting_get
+        model = WeatherModel(api_key="stub", api_url=url)
+        poller = WeatherPoller(model, min_interval=2.0, max_interval=20.0, rate_per_minute=rate_per_minute)
+        for i in range(locations):
+            poller.pin(f"site{i}")
+
+        poller.start()
+        time.sleep(seconds / 2)
+        # odpiecie i ponowne przypiecie w trakcie nie moze zostawic drugiego lancucha odswiezen
+        for i in range(0, locations, 10):
+            poller.unpin(f"site{i}")
+            poller.pin(f"site{i}")
+        time.sleep(seconds / 2)
+        poller.stop()
+        model.close()
+        with poller.condition:
+            live = collections.Counter(key for _, _, key, generation in poller.heap
+                                       if generation == poller.generations.get(key, 0))
+        assert max(live.values(), default=0) <= 1, "location scheduled twice after re-pin"
+
+        calls = np.array(sorted(calls))
+        per_second = np.searchsorted(calls, calls + 1.0) - np.arange(len(calls))
+        print(f"poller with {locations} pinned locations, limit {rate_per_minute}/min, {seconds:g} s")
+        print(f"  API calls: {len(calls)}, busiest second: {per_second.max()} calls "
+              f"(limit {rate_per_minute / 60:g}/s)")
+        print(f"  re-pinned {len(range(0, locations, 10))} locations, "
+              f"max queued refreshes per location: {max(live.values(), default=0)}")
+    finally:
+        StubWeatherHandler.do_GET = handler_get
+        server.shutdown()
+        server.server_close()
+
+
+def bench_redraw(repeat=50, num_points=100000):
+    # Agg zamiast TkAgg, zeby dalo sie uruchomic bez ekranu; renderowanie jest to samo
+    model = PlotModel()
+    model.num_points = num_points
+    frames = [model.generate_function_data(f"sin({k}*x)")[:2] for k in range(1, repeat + 1)]
+
+    start = time.perf_counter()
+    for x, y in frames:
+        figure = Figure(figsize=(6, 4), dpi=100)
+        ax = figure.add_subplot(111)
+        ax.plot(x, y)
+        ax.set_title("Plot")
+        ax.grid(True)
+        FigureCanvasAgg(figure).draw()
+    rebuild = time.perf_counter() - start
+
+    figure = Figure(figsize=(6, 4), dpi=100)
+    ax = figure.add_subplot(111)
+    ax.grid(True)
+    line, = ax.plot([], [], animated=True)
+    canvas = FigureCanvasAgg(figure)
+    ax.set_xlim(-10, 10)
+    ax.set_ylim(-1.1, 1.1)
+    canvas.draw()
+    background = canvas.copy_from_bbox(ax.bbox)
+
+    start = time.perf_counter()
+    for x, y in frames:
+        line.set_data(*decimate_minmax(x, y, ax.bbox.width))
+        canvas.restore_region(background)
+        ax.draw_artist(line)
+        canvas.blit(ax.bbox)
+    blit = time.perf_counter() - start
+
+    print(f"redraw latency, {num_points} points per plot")
+    print(f"  new Figure + canvas:      {rebuild / repeat * 1e3:8.2f} ms")
+    print(f"  set_data + blit:          {blit / repeat * 1e3:8.2f} ms ({rebuild / blit:.1f}x)")
+
+
+if __name__ == "__main__":
+    bench_login()
+    bench_tasks()
+    bench_task_search()
+    bench_task_list()
+    bench_task_bulk()
+    bench_task_paging()
+    bench_expressions()
+    bench_backends()
+    bench_plot_cache()
+    bench_weather()
+    bench_weather_batch()
+    bench_weather_restart()
+    bench_weather_history()
+    bench_weather_poller()
+    bench_redraw()
@@ -1,69 +1,902 @@
 import tkinter as tk
-from tkinter import ttk, messagebox
+from tkinter import ttk, messagebox, filedialog
+import ast
+import bisect
+import collections
+import concurrent.futures
+import csv
+import functools
+import heapq
 import json
 import os
+import queue
+import random
+import sqlite3
 import matplotlib
 
 matplotlib.use('TkAgg')
 from matplotlib.figure import Figure
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+from matplotlib.collections import LineCollection
+from matplotlib.lines import Line2D
+from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
 import numpy as np
 import requests
+try:
+    import numexpr
+except ImportError:  # opcjonalny backend obliczen wykresow
+    numexpr = None
 import smtplib
 from email.mime.text import MIMEText
 import re
+import threading
+import time
+import urllib.parse
 from datetime import datetime
 
 DATA_FILE = "data.json"
+DB_FILE = "data.db"
+STORAGE_BACKEND = "sqlite"  # "json", "journal" albo "sqlite"; tylko sqlite wczytuje zadania stronami
+SAVE_DELAY = 0.5  # sekundy, zmiany z tego okna ida jednym zapisem
+EVALUATION_BACKEND = "numpy"  # "numpy", "blocked" albo "numexpr"
+PLOT_CACHE_BYTES = 64 * 1024 * 1024  # limit pamieci na zapamietane probki wykresow
+WEATHER_API_URL = "https://api.openweathermap.org/data/2.5/weather"
+WEATHER_API_KEY = os.environ.get("OPENWEATHER_API_KEY")  # bez klucza dane pogodowe sa symulowane
+WEATHER_CACHE_TTL = 600  # sekundy
+WEATHER_MAX_CONCURRENCY = 16  # rownoczesne zapytania przy pobieraniu wielu miejsc
+WEATHER_RETRIES = 3
+WEATHER_CACHE_FILE = "weather.db"  # ostatnie odpowiedzi API, przetrwaja restart aplikacji
+WEATHER_CACHE_MAX_AGE = 7 * 24 * 3600  # sekundy, starsze wpisy sa usuwane przy starcie
+WEATHER_HISTORY_DIR = "weather_history"  # prawdziwe pomiary z API: chunk_NNNNNN.bin + tail.bin na miejsce
+WEATHER_HISTORY_WINDOW = 3 * 3600  # sekundy, okno sredniej kroczacej na wykresie historii
+WEATHER_POLL_MIN_INTERVAL = 5 * 60  # sekundy, odswiezanie przypietych miejsc
+WEATHER_POLL_MAX_INTERVAL = 60 * 60
+WEATHER_POLL_RATE = 60  # najwiecej zapytan do API na minute, dla wszystkich miejsc razem
+TASK_PAGE_SIZE = 200  # zadania doczytywane z bazy naraz, gdy lista dojdzie do konca
+
+
+TASK_PENDING = "pending"
+TASK_DONE = "done"
+LEGACY_DONE_PREFIX = "[DONE] "  # dawny zapis wykonanych zadan w samym tekscie
+
+
+class Task:
+    """Jedno zadanie usera (__slots__, bo userzy maja tysiace zadan)"""
+
+    __slots__ = ("id", "text", "status", "created", "completed", "priority", "tags", "due")
+
+    def __init__(self, task_id, text, status=TASK_PENDING, created=None, completed=None,
+                 priority=0, tags=(), due=None):
+        self.id = task_id
+        self.text = text
+        self.status = status
+        self.created = created
+        self.completed = completed
+        self.priority = priority
+        self.tags = tuple(tags)
+        self.due = due  # "YYYY-MM-DD" albo None
+
+    @property
+    def done(self):
+
+        return self.status == TASK_DONE
+
+    def to_dict(self):
 
+        return {
+            "id": self.id,
+            "text": self.text,
+            "status": self.status,
+            "created": self.created,
+            "completed": self.completed,
+            "priority": self.priority,
+            "tags": list(self.tags),
+            "due": self.due,
+        }
 
+    @classmethod
+    def from_dict(cls, record):
+
+        return cls(record["id"], record["text"], record.get("status", TASK_PENDING), record.get("created"),
+                   record.get("completed"), record.get("priority", 0), record.get("tags", ()), record.get("due"))
+
+    @classmethod
+    def from_legacy(cls, task_id, text):
+        """Zadanie zapisane starym formatem - sam napis z ewentualnym "[DONE] " na poczatku"""
+        if text.startswith(LEGACY_DONE_PREFIX):
+            return cls(task_id, text[len(LEGACY_DONE_PREFIX):], TASK_DONE)
+        return cls(task_id, text)
+
+    def __str__(self):
+
+        parts = [LEGACY_DONE_PREFIX + self.text if self.done else self.text]
+        if self.priority:
+            parts.append(f"!{self.priority}")
+        parts.extend(f"#{tag}" for tag in self.tags)
+        if self.due:
+            parts.append(f"(due {self.due})")
+        return " ".join(parts)
+
+
+def migrate_tasks(data):
+    """Zamienia wczytane zadania na rekordy Task, stare napisy dostaja nowe id.
+
+    Zwraca (liczba zadan w starym formacie, nastepne wolne id)
+    """
+    next_id = 1 + max((task.id if isinstance(task, Task) else task["id"]
+                       for user in data["users"] for task in user["tasks"] if not isinstance(task, str)),
+                      default=0)
+    migrated = 0
+    for user in data["users"]:
+        tasks = []
+        for task in user["tasks"]:
+            if isinstance(task, str):
+                task = Task.from_legacy(next_id, task)
+                next_id += 1
+                migrated += 1
+            elif not isinstance(task, Task):
+                task = Task.from_dict(task)
+            tasks.append(task)
+        user["tasks"] = tasks
+    return migrated, next_id
+
+
+def parse_task_input(text):
+    """Rozbiera wpis typu "Kupic mleko #dom !2 due:2024-05-01" na (tekst, priorytet, tagi, termin)"""
+    words, tags, priority, due = [], [], 0, None
+    for word in text.split():
+        if word.startswith("#") and len(word) > 1:
+            tags.append(word[1:].lower())
+        elif re.fullmatch(r"!\d", word):
+            priority = int(word[1:])
+        elif word.startswith("due:"):
+            due = normalize_due_date(word[4:])
+        else:
+            words.append(word)
+    return " ".join(words), priority, tags, due
+
+
+def normalize_due_date(value):
+    # ValueError dla zlej daty; "2024-5-1" -> "2024-05-01", zeby terminy sortowaly sie jak napisy
+    return datetime.strptime(value.strip(), "%Y-%m-%d").strftime("%Y-%m-%d")
+
+
+def read_task_file(path):
+    """Zadania do importu: CSV z kolumnami text, priority, tags, due albo tekst (jedno zadanie w linii).
+
+    Zwraca liste (tekst, priorytet, tagi, termin), przy zlych danych ValueError z numerem linii
+    """
+    entries = []
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if path.lower().endswith(".csv"):
+            reader = csv.DictReader(f)
+            if not reader.fieldnames or "text" not in reader.fieldnames:
+                raise ValueError("CSV file needs a 'text' column")
+            for row in reader:
+                try:
+                    priority = int(row.get("priority") or 0)
+                    due = normalize_due_date(row["due"]) if row.get("due") else None
+                except ValueError:
+                    raise ValueError(f"Line {reader.line_num}: invalid priority or due date") from None
+                tags = [tag.lstrip("#").lower() for tag in (row.get("tags") or "").replace(";", " ").split()]
+                entries.append(((row["text"] or "").strip(), priority, tags, due))
+        else:
+            for number, line in enumerate(f, 1):
+                try:
+                    entries.append(parse_task_input(line))
+                except ValueError:
+                    raise ValueError(f"Line {number}: due date must be in YYYY-MM-DD format") from None
+    return [entry for entry in entries if entry[0]]
 
-class UserModel:
 
+class TaskSearchIndex:
+    """Odwrocony indeks slow zadan (slowo -> zbior id), zmieniany przy kazdym zadaniu osobno"""
+
+    def __init__(self):
+        self.postings = {}
+        self.vocabulary = []  # posortowane slowa, do zapytan o prefiks
+
+    @staticmethod
+    def tokens(task):
+        # tagi i status sa osobnymi slowami ("#dom", "is:done"), nie myla sie z tekstem
+        words = set(re.findall(r"\w+", task.text.lower()))
+        words.update("#" + tag.lower() for tag in task.tags)
+        words.add("is:" + task.status)
+        return words
+
+    @staticmethod
+    def query_terms(term):
+
+        term = term.lower()
+        prefix = term.endswith("*")
+        term = term.rstrip("*")
+        if term.startswith(("#", "is:")):
+            return [(term, prefix)]
+        words = re.findall(r"\w+", term)
+        # prefiks dotyczy tylko ostatniego slowa, np. "e-ma*"
+        return [(word, prefix and i == len(words) - 1) for i, word in enumerate(words)]
+
+    def add(self, task):
+
+        for word in self.tokens(task):
+            ids = self.postings.get(word)
+            if ids is None:
+                ids = self.postings[word] = set()
+                bisect.insort(self.vocabulary, word)
+            ids.add(task.id)
+
+    def remove(self, task):
+
+        for word in self.tokens(task):
+            ids = self.postings[word]
+            ids.discard(task.id)
+            if not ids:
+                del self.postings[word]
+                del self.vocabulary[bisect.bisect_left(self.vocabulary, word)]
+
+    def match(self, word, prefix=False):
+
+        if not prefix:
+            return self.postings.get(word, set())
+        start = bisect.bisect_left(self.vocabulary, word)
+        end = bisect.bisect_left(self.vocabulary, word + "\U0010ffff")
+        if end - start == 1:
+            return self.postings[self.vocabulary[start]]
+        ids = set()
+        for matched in self.vocabulary[start:end]:
+            ids |= self.postings[matched]
+        return ids
+
+    def search(self, query):
+        """Zbior id pasujacych do zapytania: slowa laczy AND, grupy rozdziela OR, "mlek*" to prefiks"""
+        result = set()
+        for group in re.split(r"\s+OR\s+", query.strip()):
+            matches = [self.match(word, prefix)
+                       for term in group.split() if term != "AND"
+                       for word, prefix in self.query_terms(term)]
+            if not matches:
+                continue
+            # przecinanie od najmniejszego zbioru
+            matches.sort(key=len)
+            result |= matches[0].intersection(*matches[1:])
+        return result
+
+
+class TaskIndex:
+    """Indeksy zadan jednego usera: po id, statusie, tagu, terminie i slowach tekstu"""
+
+    def __init__(self, tasks=()):
+        self.by_id = {}
+        # slowniki id -> zadanie dzialaja jak zbiory z zachowana kolejnoscia
+        self.by_status = {TASK_PENDING: {}, TASK_DONE: {}}
+        self.by_tag = {}
+        self.due_dates = []  # posortowane (termin, id)
+        self.search = TaskSearchIndex()
+        for task in tasks:
+            self.add(task)
+
+    def add(self, task):
+
+        self.by_id[task.id] = task
+        self.search.add(task)
+        self.by_status.setdefault(task.status, {})[task.id] = task
+        for tag in task.tags:
+            self.by_tag.setdefault(tag, {})[task.id] = task
+        if task.due:
+            bisect.insort(self.due_dates, (task.due, task.id))
+
+    def remove(self, task):
+
+        del self.by_id[task.id]
+        self.search.remove(task)
+        del self.by_status[task.status][task.id]
+        for tag in task.tags:
+            tagged = self.by_tag[tag]
+            del tagged[task.id]
+            if not tagged:
+                del self.by_tag[tag]
+        if task.due:
+            del self.due_dates[bisect.bisect_left(self.due_dates, (task.due, task.id))]
+
+    def get(self, task_id):
+
+        return self.by_id.get(task_id)
+
+    def with_status(self, status):
+
+        return list(self.by_status.get(status, {}).values())
+
+    def with_tag(self, tag):
+
+        return list(self.by_tag.get(tag, {}).values())
+
+    def due_between(self, start=None, end=None):
+        """Zadania z terminem w [start, end], posortowane po terminie"""
+        low = 0 if start is None else bisect.bisect_left(self.due_dates, (start,))
+        high = len(self.due_dates) if end is None else bisect.bisect_right(self.due_dates, (end, float("inf")))
+        return [self.by_id[task_id] for _, task_id in self.due_dates[low:high]]
+
+
+def encode_record(value):
+    # rekordy z __slots__ nie sa serializowalne wprost
+    if isinstance(value, Task):
+        return value.to_dict()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def serialize_json(data):
+
+    return json.dumps(data, indent=4, default=encode_record)
+
+
+def write_text_atomically(path, text):
+    # zapis do pliku tymczasowego + os.replace, przerwany zapis nie psuje pliku
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def write_json_atomically(path, data):
+
+    write_text_atomically(path, serialize_json(data))
+
+
+def user_record(user):
+    """Dane usera bez listy zadan (do zapisu zmian profilu)"""
+    return {key: value for key, value in user.items() if key != "tasks"}
+
+
+def task_lookup(tasks_by_id, login, tasks):
+
+    by_id = tasks_by_id.get(login)
+    if by_id is None:
+        by_id = tasks_by_id[login] = {task["id"]: task for task in tasks if isinstance(task, dict)}
+    return by_id
+
+
+def apply_changes(data, changes):
+    """Nakłada zmiany z dziennika na slownik danych"""
+    users = {user["login"]: user for user in data["users"]}
+    tasks_by_id = {}  # login -> {id: zadanie}, budowane przy pierwszej zmianie zadania usera
+
+    for change in changes:
+        op = change["op"]
+        if op == "put_user":
+            record = change["user"]
+            user = users.get(record["login"])
+            if user is None:
+                user = dict(record, tasks=[])
+                data["users"].append(user)
+                users[user["login"]] = user
+            else:
+                user.update(record)
+        elif op == "put_task":
+            tasks = users[change["login"]]["tasks"]
+            by_id = task_lookup(tasks_by_id, change["login"], tasks)
+            record = by_id.get(change["task"]["id"])
+            if record is None:
+                record = dict(change["task"])
+                tasks.append(record)
+                by_id[record["id"]] = record
+            else:
+                record.update(change["task"])
+        elif op == "delete_task":
+            tasks = users[change["login"]]["tasks"]
+            record = task_lookup(tasks_by_id, change["login"], tasks).pop(change["id"], None)
+            if record is not None:
+                tasks.remove(record)
+        # starsze dzienniki adresuja zadania (napisy) indeksem na liscie
+        elif op == "add_task":
+            users[change["login"]]["tasks"].append(change["task"])
+        elif op == "set_task":
+            users[change["login"]]["tasks"][change["index"]] = change["task"]
+            tasks_by_id.pop(change["login"], None)
+        elif op == "remove_task":
+            del users[change["login"]]["tasks"][change["index"]]
+            tasks_by_id.pop(change["login"], None)
+        else:
+            raise ValueError(f"Unknown change: {op}")
+
+    return data
+
+
+class JsonFileStorage:
+    """Przechowuje wszystkie dane w jednym pliku JSON, nadpisywanym przy kazdej zmianie"""
+
+    lazy_tasks = False  # load() zwraca od razu wszystkie zadania
 
     def __init__(self, data_file):
         self.data_file = data_file
+
+    def load(self):
+
+        if not os.path.exists(self.data_file):
+            return None
+        with open(self.data_file, 'r') as f:
+            data = json.load(f)
+        data.pop("journal_seq", None)
+        return data
+
+    def save_all(self, data):
+
+        write_json_atomically(self.data_file, data)
+
+    def prepare_commit(self, data, changes):
+        """Serializuje dane pod lockiem modelu; sam zapis robi write_commit juz bez niego"""
+        return serialize_json(data)
+
+    def write_commit(self, payload):
+
+        write_text_atomically(self.data_file, payload)
+
+    def commit(self, data, changes):
+
+        self.write_commit(self.prepare_commit(data, changes))
+
+    def close(self):
+        pass
+
+
+class JournalStorage:
+    """Snapshot w pliku JSON + dopisywany dziennik zmian (write-ahead log)"""
+
+    lazy_tasks = False
+
+    def __init__(self, data_file, compact_every=500):
+        self.data_file = data_file
+        self.journal_file = data_file + ".journal"
+        self.compact_every = compact_every
+        self.seq = 0
+        self.journal_length = 0
+
+    def load(self):
+
+        data = None
+        snapshot_seq = 0
+        if os.path.exists(self.data_file):
+            with open(self.data_file, 'r') as f:
+                data = json.load(f)
+            snapshot_seq = data.pop("journal_seq", 0)
+
+        changes = self.read_journal()
+        if data is None and not changes:
+            return None
+        if data is None:
+            data = {"users": []}
+
+        # wpisy starsze niz snapshot zostaly juz w nim zapisane (przerwana kompakcja)
+        pending = [change for change in changes if change["seq"] > snapshot_seq]
+        apply_changes(data, pending)
+
+        self.seq = max([snapshot_seq] + [change["seq"] for change in changes])
+        self.journal_length = len(pending)
+        return data
+
+    def read_journal(self):
+
+        if not os.path.exists(self.journal_file):
+            return []
+
+        changes = []
+        valid_size = 0
+        with open(self.journal_file, 'rb') as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    changes.append(json.loads(line))
+                except ValueError:
+                    break
+                valid_size += len(line)
+
+        # ucina niedokonczony wpis po awarii w trakcie zapisu
+        if valid_size != os.path.getsize(self.journal_file):
+            with open(self.journal_file, 'r+b') as f:
+                f.truncate(valid_size)
+
+        return changes
+
+    def save_all(self, data):
+
+        self.journal_length = 0
+        self.write_snapshot(serialize_json(dict(data, journal_seq=self.seq)))
+
+    def write_snapshot(self, snapshot):
+
+        write_text_atomically(self.data_file, snapshot)
+        with open(self.journal_file, 'w') as f:
+            f.flush()
+            os.fsync(f.fileno())
+
+    def prepare_commit(self, data, changes):
+        """Pod lockiem modelu: wpisy dziennika i, gdy czas na kompakcje, snapshot jako tekst"""
+        lines = []
+        for change in changes:
+            self.seq += 1
+            lines.append(json.dumps(dict(change, seq=self.seq)) + "\n")
+
+        snapshot = None
+        self.journal_length += len(changes)
+        if self.journal_length >= self.compact_every:
+            self.journal_length = 0
+            snapshot = serialize_json(dict(data, journal_seq=self.seq))
+        return "".join(lines), snapshot
+
+    def write_commit(self, payload):
+
+        lines, snapshot = payload
+        if lines:
+            with open(self.journal_file, 'a') as f:
+                f.write(lines)
+                f.flush()
+                os.fsync(f.fileno())
+        if snapshot is not None:
+            self.write_snapshot(snapshot)
+
+    def commit(self, data, changes):
+
+        if changes:
+            self.write_commit(self.prepare_commit(data, changes))
+
+    def compact(self, data):
+
+        self.save_all(data)
+
+    def close(self):
+        pass
+
+
+class SqliteStorage:
+    """Uzytkownicy i zadania w bazie SQLite, jedna zmiana = jeden wiersz"""
+
+    lazy_tasks = True  # load() zwraca userow bez zadan, zadania czyta load_tasks strona po stronie
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS users (
+            login TEXT PRIMARY KEY,
+            password TEXT NOT NULL,
+            email TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS tasks (
+            id INTEGER PRIMARY KEY,
+            login TEXT NOT NULL REFERENCES users(login),
+            task TEXT NOT NULL,
+            status TEXT,
+            created REAL,
+            completed REAL,
+            priority INTEGER NOT NULL DEFAULT 0,
+            tags TEXT NOT NULL DEFAULT '[]',
+            due TEXT
+        );
+        CREATE INDEX IF NOT EXISTS tasks_by_login ON tasks(login, id);
+    """
+    # kolumny dodane po wersji, w ktorej zadanie bylo samym napisem (status NULL = stary wiersz)
+    TASK_COLUMNS = {
+        "status": "TEXT",
+        "created": "REAL",
+        "completed": "REAL",
+        "priority": "INTEGER NOT NULL DEFAULT 0",
+        "tags": "TEXT NOT NULL DEFAULT '[]'",
+        "due": "TEXT",
+    }
+
+    UPSERT_USER = (
+        "INSERT INTO users (login, password, email) VALUES (?, ?, ?) "
+        "ON CONFLICT(login) DO UPDATE SET password = excluded.password, email = excluded.email"
+    )
+    UPSERT_TASK = (
+        "INSERT INTO tasks (id, login, task, status, created, completed, priority, tags, due) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+        "ON CONFLICT(id) DO UPDATE SET task = excluded.task, status = excluded.status, "
+        "created = excluded.created, completed = excluded.completed, priority = excluded.priority, "
+        "tags = excluded.tags, due = excluded.due"
+    )
+    DELETE_TASK = "DELETE FROM tasks WHERE id = ?"
+
+    def __init__(self, db_file):
+        self.db_file = db_file
+        self.connection = sqlite3.connect(db_file, timeout=10, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(self.SCHEMA)
+        self.upgrade_schema()
+
+    def upgrade_schema(self):
+
+        columns = {row[1] for row in self.connection.execute("PRAGMA table_info(tasks)")}
+        with self.connection:
+            for name, definition in self.TASK_COLUMNS.items():
+                if name not in columns:
+                    self.connection.execute(f"ALTER TABLE tasks ADD COLUMN {name} {definition}")
+            if "status" not in columns:
+                # wiersze sprzed rekordow zadan: sam tekst, wykonane z "[DONE] " na poczatku
+                self.connection.execute(
+                    "UPDATE tasks SET status = ?, task = substr(task, ?) WHERE substr(task, 1, ?) = ?",
+                    (TASK_DONE, len(LEGACY_DONE_PREFIX) + 1, len(LEGACY_DONE_PREFIX), LEGACY_DONE_PREFIX)
+                )
+                self.connection.execute("UPDATE tasks SET status = ? WHERE status IS NULL", (TASK_PENDING,))
+
+    @staticmethod
+    def task_row(login, record):
+
+        return (record["id"], login, record["text"], record["status"], record["created"], record["completed"],
+                record["priority"], json.dumps(record["tags"]), record["due"])
+
+    def load(self):
+
+        users = []
+        for login, password, email in self.connection.execute(
+                "SELECT login, password, email FROM users ORDER BY rowid"):
+            users.append({"login": login, "password": password, "email": email, "tasks": []})
+
+        if not users:
+            return None
+        return {"users": users}
+
+    def load_tasks(self, login, after_id, limit):
+        """Strona zadan usera o id wiekszym niz after_id (kursor), najwyzej limit sztuk"""
+        rows = self.connection.execute(
+            "SELECT id, task, status, created, completed, priority, tags, due FROM tasks "
+            "WHERE login = ? AND id > ? ORDER BY id LIMIT ?",
+            (login, after_id, limit)
+        )
+        return [
+            {"id": task_id, "text": text, "status": status, "created": created, "completed": completed,
+             "priority": priority, "tags": json.loads(tags), "due": due}
+            for task_id, text, status, created, completed, priority, tags, due in rows
+        ]
+
+    def max_task_id(self):
+
+        return self.connection.execute("SELECT COALESCE(MAX(id), 0) FROM tasks").fetchone()[0]
+
+    def save_all(self, data):
+
+        # listy zadan moga byc wczytane tylko czesciowo, wiec nic nie jest kasowane;
+        # usuniecia trafiaja do bazy przez commit jako delete_task
+        with self.connection:
+            self.connection.executemany(
+                self.UPSERT_USER,
+                [(user["login"], user["password"], user["email"]) for user in data["users"]]
+            )
+            self.connection.executemany(
+                self.UPSERT_TASK,
+                [self.task_row(user["login"], task.to_dict()) for user in data["users"] for task in user["tasks"]]
+            )
+
+    def prepare_commit(self, data, changes):
+
+        # zmiany zawieraja juz kopie rekordow, wystarczy je zapamietac
+        return list(changes)
+
+    def write_commit(self, payload):
+
+        with self.connection:
+            for change in payload:
+                op = change["op"]
+                if op == "put_user":
+                    user = change["user"]
+                    self.connection.execute(self.UPSERT_USER, (user["login"], user["password"], user["email"]))
+                elif op == "put_task":
+                    self.connection.execute(self.UPSERT_TASK, self.task_row(change["login"], change["task"]))
+                elif op == "delete_task":
+                    self.connection.execute(self.DELETE_TASK, (change["id"],))
+                else:
+                    raise ValueError(f"Unknown change: {op}")
+
+    def commit(self, data, changes):
+
+        self.write_commit(self.prepare_commit(data, changes))
+
+    def close(self):
+
+        self.connection.close()
+
+
+def remove_sqlite_files(db_file):
+
+    for path in (db_file, db_file + "-wal", db_file + "-shm", db_file + "-journal"):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def migrate_json_to_sqlite(data_file, db_file):
+    """Jednorazowo przenosi data.json (razem z dziennikiem) do bazy SQLite"""
+    data = JournalStorage(data_file).load()
+    if data is None:
+        return 0
+    migrate_tasks(data)
+
+    # baza powstaje obok i trafia na miejsce dopiero w calosci - po przerwanej migracji
+    # nie ma data.db, wiec nastepny start migruje od nowa zamiast zaczac od pustej bazy
+    tmp_file = db_file + ".tmp"
+    remove_sqlite_files(tmp_file)
+    try:
+        storage = SqliteStorage(tmp_file)
+        try:
+            storage.save_all(data)
+        finally:
+            storage.close()  # zamkniecie przenosi WAL do pliku bazy
+        os.replace(tmp_file, db_file)
+    except BaseException:
+        remove_sqlite_files(tmp_file)
+        raise
+    return len(data["users"])
+
+
+class SaveScheduler:
+    """Laczy zmiany z krotkiego okna czasu w jeden zapis wykonywany w watku w tle"""
+
+    def __init__(self, storage, lock, delay=SAVE_DELAY, write_lock=None):
+        self.storage = storage
+        self.lock = lock
+        # kolejnosc zapisow na dysk; lock modelu jest trzymany tylko na czas serializacji
+        self.write_lock = write_lock if write_lock is not None else threading.RLock()
+        self.delay = delay
+        self.data = None
+        self.pending = []
+        self.dirty = False
+        self.timer = None
+        self.writes = 0
+
+    def schedule(self, data, changes):
+
+        with self.lock:
+            self.data = data
+            self.pending.extend(changes)
+            self.dirty = True
+            if self.timer is None:
+                self.timer = threading.Timer(self.delay, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def flush(self):
+
+        # write_lock zawsze przed lockiem modelu, nigdy odwrotnie
+        with self.write_lock:
+            # lock modelu chroni dane tylko w trakcie serializacji, fsync idzie juz bez niego
+            with self.lock:
+                if self.timer is not None:
+                    self.timer.cancel()
+                    self.timer = None
+                if not self.dirty:
+                    return
+
+                changes, self.pending = self.pending, []
+                self.dirty = False
+                payload = self.storage.prepare_commit(self.data, changes)
+
+            try:
+                self.storage.write_commit(payload)
+            except Exception:
+                with self.lock:
+                    self.pending = changes + self.pending
+                    self.dirty = True
+                raise
+            self.writes += 1
+
+
+def create_storage(backend=STORAGE_BACKEND, data_file=DATA_FILE, db_file=DB_FILE):
+
+    if backend == "json":
+        return JsonFileStorage(data_file)
+    if backend == "journal":
+        return JournalStorage(data_file)
+    if backend == "sqlite":
+        if not os.path.exists(db_file) and os.path.exists(data_file):
+            migrate_json_to_sqlite(data_file, db_file)
+        return SqliteStorage(db_file)
+    raise ValueError(f"Unknown storage backend: {backend}")
+
+
+
+class UserModel:
+
+
+    def __init__(self, data_file, storage=None, save_delay=None):
+        self.data_file = data_file
+        self.storage = storage if storage is not None else JsonFileStorage(data_file)
+        self.lock = threading.RLock()
+        # brany przed self.lock przez wszystko, co pisze na dysk w tle albo czeka na taki zapis
+        self.write_lock = threading.RLock()
+        # save_delay=None oznacza zapis synchroniczny przy kazdej zmianie
+        self.save_scheduler = None
+        if save_delay is not None:
+            self.save_scheduler = SaveScheduler(self.storage, self.lock, save_delay, self.write_lock)
         self.data = None
+        self.users_by_login = {}
         self.current_user = None
+        self.next_task_id = 1
         self.load_data()
 
     def load_data(self):
 
-        if not os.path.exists(self.data_file):
+        self.data = self.storage.load()
+        if self.data is None:
             self.data = {
                 "users": [
                     {
                         "login": "admin",
                         "password": "admin",
                         "email": "admin@admin.com",
-                        "tasks": ["Task 1", "Task 2"]
+                        "tasks": [Task(1, "Task 1", created=time.time()), Task(2, "Task 2", created=time.time())]
                     }
                 ]
             }
             self.save_data()
-        else:
-            with open(self.data_file, 'r') as f:
-                self.data = json.load(f)
+
+        migrated, self.next_task_id = migrate_tasks(self.data)
+        if migrated:
+            # zadania w starym formacie od razu zapisujemy z nadanymi id
+            self.save_data()
+        if self.storage.lazy_tasks:
+            self.next_task_id = max(self.next_task_id, self.storage.max_task_id() + 1)
+
+        self.rebuild_user_index()
+
+    def load_task_page(self, login, after_id, limit):
+        """Kolejna strona zadan usera prosto z bazy (tylko storage z lazy_tasks)"""
+        with self.write_lock:
+            # oczekujace zmiany musza byc w bazie, inaczej wrocilyby np. usuniete zadania
+            self.flush()
+            return self.storage.load_tasks(login, after_id, limit)
+
+    def allocate_task_id(self):
+
+        with self.lock:
+            task_id = self.next_task_id
+            self.next_task_id += 1
+        return task_id
+
+    def rebuild_user_index(self):
+
+        self.users_by_login = {}
+        for user in self.data["users"]:
+            self.users_by_login.setdefault(user["login"], user)
+
+    def find_user(self, username):
+
+        return self.users_by_login.get(username)
 
     def save_data(self):
 
-        with open(self.data_file, 'w') as f:
-            json.dump(self.data, f, indent=4)
+        with self.write_lock:
+            self.flush()
+            with self.lock:
+                self.storage.save_all(self.data)
+
+    def commit_changes(self, changes):
+        """Zapisuje tylko podane zmiany (dla JsonFileStorage caly plik)"""
+        if self.save_scheduler is not None:
+            self.save_scheduler.schedule(self.data, changes)
+        else:
+            self.storage.commit(self.data, changes)
+
+    def flush(self):
+
+        if self.save_scheduler is not None:
+            self.save_scheduler.flush()
+
+    def close(self):
+
+        self.flush()
+        self.storage.close()
 
     def authenticate_user(self, username, password):
 
-        for user in self.data["users"]:
-            if user["login"] == username and user["password"] == password:
-                self.current_user = user
-                return True
+        user = self.find_user(username)
+        if user is not None and user["password"] == password:
+            self.current_user = user
+            return True
         return False
 
     def register_new_user(self, username, password, email):
         """Rejestruje nowego usera"""
 
-        for user in self.data["users"]:
-            if user["login"] == username:
-                return False, "Login already exists"
+        if self.find_user(username) is not None:
+            return False, "Login already exists"
 
 
         if not re.match(r"[^@]+@[^@]+\.[^@]+", email):
@@ -77,8 +910,10 @@ class UserModel:
             "tasks": []
         }
 
-        self.data["users"].append(new_user)
-        self.save_data()
+        with self.lock:
+            self.data["users"].append(new_user)
+            self.users_by_login[username] = new_user
+            self.commit_changes([{"op": "put_user", "user": user_record(new_user)}])
         return True, "Registration successful"
 
     def update_current_user_profile(self, email, password):
@@ -89,20 +924,16 @@ class UserModel:
         if not re.match(r"[^@]+@[^@]+\.[^@]+", email):
             return False, "Invalid email format"
 
-        self.current_user["email"] = email
-        self.current_user["password"] = password
-
-
-        for i, user in enumerate(self.data["users"]):
-            if user["login"] == self.current_user["login"]:
-                self.data["users"][i] = self.current_user
-                break
-
-        self.save_data()
+        # current_user jest tym samym slownikiem co wpis w data["users"]
+        with self.lock:
+            self.current_user["email"] = email
+            self.current_user["password"] = password
+            self.commit_changes([{"op": "put_user", "user": user_record(self.current_user)}])
         return True, "Profile updated successfully"
 
     def logout_user(self):
 
+        self.flush()
         self.current_user = None
 
     def get_current_user_data(self):
@@ -115,18 +946,88 @@ class TaskModel:
 
     def __init__(self, user_model):
         self.user_model = user_model
+        self.index = None
+        self.indexed_user = None
+        # login -> id ostatniego zadania wczytanego z bazy; None = cala lista jest juz w pamieci,
+        # brak wpisu = jeszcze nic nie wczytano (nastepne logowanie nie czyta listy od nowa)
+        self.task_cursors = {}
+
+    def get_index(self):
+        """Indeksy zadan zalogowanego usera, budowane raz po zalogowaniu"""
+        user = self.user_model.current_user
+        if user is None:
+            return None
+        if self.indexed_user is not user:
+            self.index = TaskIndex(user["tasks"])
+            self.indexed_user = user
+            if self.user_model.storage.lazy_tasks and user["login"] not in self.task_cursors:
+                self.task_cursors[user["login"]] = 0
+        return self.index
+
+    def has_more_tasks(self):
+
+        user = self.user_model.current_user
+        return user is not None and self.task_cursors.get(user["login"]) is not None
+
+    def load_more_tasks(self, limit=TASK_PAGE_SIZE):
+        """Doczytuje z bazy kolejna strone zadan zalogowanego usera, zwraca ile zadan doszlo"""
+        index = self.get_index()
+        if index is None or not self.has_more_tasks():
+            return 0
+
+        login = self.user_model.current_user["login"]
+        cursor = self.task_cursors[login]
+        # odczyt bazy czeka na zapis w tle, wiec idzie bez locka modelu
+        records = self.user_model.load_task_page(login, cursor, limit)
+        with self.user_model.lock:
+            if len(records) < limit:
+                self.task_cursors[login] = None
+            else:
+                self.task_cursors[login] = records[-1]["id"]
 
-    def add_new_task(self, task_text):
+            # zadania dodane w tej sesji (id > kursor) sa juz na koncu listy i w indeksie
+            tasks = self.user_model.current_user["tasks"]
+            position = len(tasks)
+            while position and tasks[position - 1].id > cursor:
+                position -= 1
+            page = [Task.from_dict(record) for record in records if record["id"] not in index.by_id]
+            tasks[position:position] = page
+            for task in page:
+                index.add(task)
+        return len(page)
 
-        if not self.user_model.current_user:
-            return False
+    def load_all_tasks(self):
 
-        if not task_text.strip():
-            return False
+        while self.has_more_tasks():
+            self.load_more_tasks(limit=max(TASK_PAGE_SIZE, 10000))
 
-        self.user_model.current_user["tasks"].append(task_text)
-        self.user_model.save_data()
-        return True
+    def commit_tasks(self, tasks):
+
+        login = self.user_model.current_user["login"]
+        self.user_model.commit_changes([{"op": "put_task", "login": login, "task": task.to_dict()} for task in tasks])
+
+    def add_new_task(self, task_text, priority=0, tags=(), due=None):
+        """Dodaje zadanie, zwraca nowy rekord albo None"""
+        tasks = self.add_new_tasks([(task_text, priority, tags, due)])
+        return tasks[0] if tasks else None
+
+    def add_new_tasks(self, entries):
+        """Dodaje zadania (tekst, priorytet, tagi, termin) jednym zapisem, zwraca nowe rekordy"""
+        index = self.get_index()
+        if index is None:
+            return []
+
+        now = time.time()
+        with self.user_model.lock:
+            tasks = [Task(self.user_model.allocate_task_id(), text.strip(), created=now,
+                          priority=priority, tags=tags, due=due)
+                     for text, priority, tags, due in entries if text.strip()]
+            if tasks:
+                self.user_model.current_user["tasks"].extend(tasks)
+                for task in tasks:
+                    index.add(task)
+                self.commit_tasks(tasks)
+        return tasks
 
     def get_all_tasks(self):
 
@@ -134,33 +1035,940 @@ class TaskModel:
             return []
         return self.user_model.current_user["tasks"]
 
-    def mark_task_as_done(self, task_index):
+    def find_tasks(self, task_ids):
+        """Rekordy zadan o podanych id (bez powtorzen); nieznane id doczytuja reszte listy z bazy"""
+        index = self.get_index()
+        if index is None:
+            return []
 
-        if not self.user_model.current_user:
-            return False
+        task_ids = list(dict.fromkeys(task_ids))
+        if self.has_more_tasks() and any(task_id not in index.by_id for task_id in task_ids):
+            self.load_all_tasks()
+        return [index.by_id[task_id] for task_id in task_ids if task_id in index.by_id]
 
-        tasks = self.user_model.current_user["tasks"]
-        if 0 <= task_index < len(tasks):
-            task = tasks[task_index]
-            if not task.startswith("[DONE] "):
-                tasks[task_index] = f"[DONE] {task}"
-                self.user_model.save_data()
-                return True
-        return False
+    def get_task(self, task_id):
 
-    def remove_task_by_index(self, task_index):
+        tasks = self.find_tasks([task_id])
+        return tasks[0] if tasks else None
 
-        if not self.user_model.current_user:
-            return False
+    def get_tasks(self, status=None, tag=None, due_before=None, offset=0, limit=None):
+        """Zadania spelniajace wszystkie podane warunki, od pozycji offset najwyzej limit sztuk.
+
+        Bez warunkow doczytuje z bazy tylko potrzebne strony, filtry potrzebuja calej listy
+        """
+        index = self.get_index()
+        if index is None:
+            return []
+
+        end = None if limit is None else offset + limit
+        if status is None and tag is None and due_before is None:
+            if end is None:
+                self.load_all_tasks()
+            tasks = self.get_all_tasks()
+            while end is not None and len(tasks) < end and self.has_more_tasks():
+                self.load_more_tasks(limit=max(TASK_PAGE_SIZE, end - len(tasks)))
+            return tasks[offset:end]
+
+        self.load_all_tasks()
+        if tag is not None:
+            tasks = index.with_tag(tag)
+        elif due_before is not None:
+            tasks = index.due_between(end=due_before)
+        else:
+            tasks = index.with_status(status)
 
-        tasks = self.user_model.current_user["tasks"]
+        if status is not None and (tag is not None or due_before is not None):
+            tasks = [task for task in tasks if task.status == status]
+        if due_before is not None and tag is not None:
+            tasks = [task for task in tasks if task.due and task.due <= due_before]
+        return tasks[offset:end]
+
+    def search_tasks(self, query, status=None, tag=None):
+        """Zadania pasujace do zapytania (patrz TaskSearchIndex.search), posortowane po id"""
+        index = self.get_index()
+        if index is None:
+            return []
+
+        self.load_all_tasks()
+        ids = index.search.search(query)
+        if status is not None:
+            ids &= index.by_status.get(status, {}).keys()
+        if tag is not None:
+            ids &= index.by_tag.get(tag, {}).keys()
+        return [index.by_id[task_id] for task_id in sorted(ids)]
+
+    def mark_task_as_done(self, task_id):
+
+        return self.mark_tasks_as_done([task_id]) == 1
+
+    def mark_tasks_as_done(self, task_ids):
+        """Oznacza zadania jako wykonane jednym zapisem, zwraca ile sie zmienilo"""
+        index = self.get_index()
+        if index is None:
+            return 0
+
+        now = time.time()
+        found = self.find_tasks(task_ids)
+        with self.user_model.lock:
+            tasks = [task for task in found if not task.done]
+            for task in tasks:
+                index.remove(task)
+                task.status = TASK_DONE
+                task.completed = now
+                index.add(task)
+            if tasks:
+                self.commit_tasks(tasks)
+        return len(tasks)
+
+    def remove_task(self, task_id):
+
+        return self.remove_tasks([task_id]) == 1
+
+    def remove_tasks(self, task_ids):
+        """Usuwa zadania jednym zapisem, zwraca ile usunieto"""
+        index = self.get_index()
+        if index is None:
+            return 0
+
+        removed = self.find_tasks(task_ids)
+        with self.user_model.lock:
+            if not removed:
+                return 0
+            for task in removed:
+                index.remove(task)
+            removed_ids = {task.id for task in removed}
+            tasks = self.user_model.current_user["tasks"]
+            tasks[:] = [task for task in tasks if task.id not in removed_ids]
+            login = self.user_model.current_user["login"]
+            self.user_model.commit_changes([{"op": "delete_task", "login": login, "id": task.id} for task in removed])
+        return len(removed)
+
+    def remove_task_by_index(self, task_index):
+
+        tasks = self.get_all_tasks()
         if 0 <= task_index < len(tasks):
-            del tasks[task_index]
-            self.user_model.save_data()
-            return True
+            return self.remove_task(tasks[task_index].id)
         return False
 
 
+# funkcje i stale dozwolone w wyrazeniach wpisywanych przez usera
+SAFE_FUNCTIONS = {
+    "sin": np.sin, "cos": np.cos, "tan": np.tan,
+    "arcsin": np.arcsin, "arccos": np.arccos, "arctan": np.arctan,
+    "asin": np.arcsin, "acos": np.arccos, "atan": np.arctan,
+    "sinh": np.sinh, "cosh": np.cosh, "tanh": np.tanh,
+    "arcsinh": np.arcsinh, "arccosh": np.arccosh, "arctanh": np.arctanh,
+    "exp": np.exp, "expm1": np.expm1,
+    "log": np.log, "log10": np.log10, "log2": np.log2, "log1p": np.log1p,
+    "sqrt": np.sqrt, "cbrt": np.cbrt, "abs": np.absolute,
+    "floor": np.floor, "ceil": np.ceil, "sign": np.sign,
+    "arctan2": np.arctan2, "hypot": np.hypot,
+    "minimum": np.minimum, "maximum": np.maximum,
+}
+SAFE_CONSTANTS = {"pi": np.pi, "e": np.e}
+SAFE_OPERATORS = (
+    ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow,
+    ast.UAdd, ast.USub,
+)
+
+
+@functools.lru_cache(maxsize=1024)
+def normalize_expression(source):
+
+    # postac kanoniczna z drzewa AST - usuniecie wszystkich spacji zmienia znaczenie ("not x" -> "notx");
+    # przy bledzie skladni zostaje tekst, a SyntaxError zglosi kompilacja
+    source = " ".join(source.split())
+    try:
+        return ast.unparse(ast.parse(source, mode="eval"))
+    except SyntaxError:
+        return source
+
+
+def validate_expression(node, variables):
+
+    if isinstance(node, ast.Expression):
+        validate_expression(node.body, variables)
+    elif isinstance(node, ast.BinOp):
+        if not isinstance(node.op, SAFE_OPERATORS):
+            raise ValueError(f"Unsupported operator: {type(node.op).__name__}")
+        validate_expression(node.left, variables)
+        validate_expression(node.right, variables)
+    elif isinstance(node, ast.UnaryOp):
+        if not isinstance(node.op, SAFE_OPERATORS):
+            raise ValueError(f"Unsupported operator: {type(node.op).__name__}")
+        validate_expression(node.operand, variables)
+    elif isinstance(node, ast.Call):
+        if not isinstance(node.func, ast.Name) or node.func.id not in SAFE_FUNCTIONS:
+            raise ValueError(f"Unsupported function: {getattr(node.func, 'id', type(node.func).__name__)}")
+        if node.keywords:
+            raise ValueError(f"Keyword arguments are not supported in {node.func.id}()")
+        expected = SAFE_FUNCTIONS[node.func.id].nin
+        if len(node.args) != expected:
+            raise ValueError(f"{node.func.id}() takes {expected} argument(s), got {len(node.args)}")
+        for arg in node.args:
+            validate_expression(arg, variables)
+    elif isinstance(node, ast.Name):
+        if node.id not in variables and node.id not in SAFE_CONSTANTS:
+            raise ValueError(f"Unknown name: {node.id}")
+    elif isinstance(node, ast.Constant):
+        if isinstance(node.value, bool) or not isinstance(node.value, (int, float)):
+            raise ValueError(f"Unsupported constant: {node.value!r}")
+    else:
+        raise ValueError(f"Unsupported syntax: {type(node).__name__}")
+
+
+BINARY_UFUNCS = {
+    ast.Add: np.add, ast.Sub: np.subtract, ast.Mult: np.multiply, ast.Div: np.true_divide,
+    ast.FloorDiv: np.floor_divide, ast.Mod: np.remainder, ast.Pow: np.power,
+}
+COMMUTATIVE_UFUNCS = (np.add, np.multiply, np.minimum, np.maximum, np.hypot)
+
+
+class CompiledExpression:
+    """Wyrazenie sparsowane i skompilowane raz, wywolywane dla dowolnych danych.
+
+    Drzewo ast jest zamieniane na liste wywolan ufuncow (instructions): stale sa
+    zwijane przy kompilacji, a powtarzajace sie podwyrazenia liczone tylko raz.
+    Dla kazdego zestawu ksztaltow danych powstaje plan wywolan ufuncow z out=,
+    ktory uzywa ponownie buforow niepotrzebnych juz wynikow posrednich. Male dane
+    licza sie zwykla funkcja z tych samych instrukcji (function) - tam narzut
+    planu jest wiekszy niz zysk z buforow.
+    """
+
+    MAX_PLANS = 8  # plany ostatnio uzywanych ksztaltow (LRU), probkowanie adaptacyjne daje rozne dlugosci
+    PLAN_MIN_SIZE = 16384  # od tylu elementow wyniku oplaca sie plan z buforami
+    INTEGER_POWERS = frozenset(float(exponent) for exponent in range(2, 17))
+
+    def __init__(self, source, variables=("x",)):
+        self.source = source
+        self.variables = variables
+
+        tree = ast.parse(source, mode="eval")
+        validate_expression(tree, variables)
+
+        # liczby jako float, zeby np. 10**10**10 nie liczylo sie na int bez konca
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Constant):
+                node.value = float(node.value)
+
+        # operand: ("var", indeks), ("const", wartosc) albo ("reg", numer instrukcji)
+        self.instructions = []
+        self.subexpressions = {}
+        self.result = self.emit(tree.body)
+        self.last_use = {}
+        for index, (ufunc, operands) in enumerate(self.instructions):
+            for kind, value in operands:
+                if kind == "reg":
+                    self.last_use[value] = index
+        self.plans = collections.OrderedDict()
+        self.plans_lock = threading.Lock()  # BlockedExpression wola z kilku watkow naraz
+        self.function = self.build_function()
+
+    def emit(self, node):
+
+        if isinstance(node, ast.Constant):
+            return ("const", node.value)
+        if isinstance(node, ast.Name):
+            if node.id in self.variables:
+                return ("var", self.variables.index(node.id))
+            return ("const", float(SAFE_CONSTANTS[node.id]))
+        if isinstance(node, ast.UnaryOp):
+            operand = self.emit(node.operand)
+            return operand if isinstance(node.op, ast.UAdd) else self.apply(np.negative, [operand])
+        if isinstance(node, ast.BinOp):
+            left, right = self.emit(node.left), self.emit(node.right)
+            # np.power z wykladnikiem calkowitym jest kilkadziesiat razy wolniejszy niz mnozenia
+            if (isinstance(node.op, ast.Pow) and left[0] != "const" and right[0] == "const"
+                    and right[1] in self.INTEGER_POWERS):
+                return self.integer_power(left, int(right[1]))
+            return self.apply(BINARY_UFUNCS[type(node.op)], [left, right])
+        # ast.Call, poprawnosc sprawdzona w validate_expression
+        return self.apply(SAFE_FUNCTIONS[node.func.id], [self.emit(arg) for arg in node.args])
+
+    def integer_power(self, base, exponent):
+        """base**exponent przez podnoszenie do kwadratu (square i multiply)"""
+        if exponent == 1:
+            return base
+        square = self.apply(np.square, [self.integer_power(base, exponent // 2)])
+        return self.apply(np.multiply, [square, base]) if exponent % 2 else square
+
+    def apply(self, ufunc, operands):
+
+        if all(kind == "const" for kind, _ in operands):
+            with np.errstate(all="ignore"):
+                return ("const", float(ufunc(*[value for _, value in operands])))
+
+        if ufunc in COMMUTATIVE_UFUNCS:
+            operands = sorted(operands, key=repr)
+        key = (ufunc.__name__, tuple(operands))
+        if key not in self.subexpressions:
+            self.instructions.append((ufunc, list(operands)))
+            self.subexpressions[key] = ("reg", len(self.instructions) - 1)
+        return self.subexpressions[key]
+
+    def build_function(self):
+        """Instrukcje jako funkcja Pythona: r0 = u0(v0, c0); r1 = u1(r0); ... return r1"""
+        namespace = {"__builtins__": {}}
+
+        def operand_name(operand):
+            kind, value = operand
+            if kind == "const":
+                namespace[f"c{len(namespace)}"] = value
+                return f"c{len(namespace) - 1}"
+            return f"{'v' if kind == 'var' else 'r'}{value}"
+
+        lines = []
+        for index, (ufunc, operands) in enumerate(self.instructions):
+            namespace[f"u{index}"] = ufunc
+            lines.append(f"    r{index} = u{index}({', '.join(operand_name(operand) for operand in operands)})")
+        arguments = ", ".join(f"v{index}" for index in range(len(self.variables)))
+        # w tekscie sa tylko wygenerowane nazwy, wartosci leza w namespace
+        source = f"def function({arguments}):\n" + "\n".join(lines) + f"\n    return {operand_name(self.result)}\n"
+        exec(compile(source, "<expression>", "exec"), namespace)
+        return namespace["function"]
+
+    def build_plan(self, shapes):
+        """Przydzial buforow dla danych o podanych ksztaltach.
+
+        Kroki planu to (ufunc, indeksy argumentow, indeks wyniku) w tablicy
+        storage = bufory + zmienne + stale.
+        """
+        register_shapes = []
+        register_slots = []
+        slot_shapes = []
+        free_slots = {}
+        steps = []
+        constants = []
+
+        def operand_shape(operand):
+            kind, value = operand
+            if kind == "var":
+                return shapes[value]
+            if kind == "reg":
+                return register_shapes[value]
+            return ()
+
+        def operand_index(operand):
+            kind, value = operand
+            if kind == "reg":
+                return register_slots[value]
+            if kind == "var":
+                return ("var", value)
+            constants.append(value)
+            return ("const", len(constants) - 1)
+
+        for index, (ufunc, operands) in enumerate(self.instructions):
+            shape = np.broadcast_shapes(*[operand_shape(operand) for operand in operands])
+            arguments = [operand_index(operand) for operand in operands]
+
+            # bufory wejsc uzytych po raz ostatni moga od razu przyjac wynik (liczenie w miejscu)
+            for kind, value in set(operands):
+                if kind == "reg" and self.last_use[value] == index and ("reg", value) != self.result:
+                    free_slots.setdefault(register_shapes[value], []).append(register_slots[value])
+
+            if free_slots.get(shape):
+                slot = free_slots[shape].pop()
+            else:
+                slot = len(slot_shapes)
+                slot_shapes.append(shape)
+            register_shapes.append(shape)
+            register_slots.append(slot)
+            steps.append((ufunc, arguments, slot))
+
+        # indeksy zmiennych i stalych dopiero teraz, gdy znana jest liczba buforow
+        variables_start = len(slot_shapes)
+        constants_start = variables_start + len(shapes)
+
+        def resolve(argument):
+            if isinstance(argument, int):
+                return argument
+            kind, value = argument
+            return (variables_start if kind == "var" else constants_start) + value
+
+        steps = [(ufunc, tuple(resolve(argument) for argument in arguments), slot)
+                 for ufunc, arguments, slot in steps]
+
+        result_slot = register_slots[self.result[1]] if self.result[0] == "reg" else None
+        return steps, slot_shapes, constants, result_slot
+
+    def get_plan(self, shapes):
+
+        with self.plans_lock:
+            plan = self.plans.get(shapes)
+            if plan is not None:
+                self.plans.move_to_end(shapes)
+                return plan
+
+        plan = self.build_plan(shapes)
+        with self.plans_lock:
+            self.plans[shapes] = plan
+            while len(self.plans) > self.MAX_PLANS:
+                self.plans.popitem(last=False)
+        return plan
+
+    def __call__(self, *values, out=None):
+
+        kind, value = self.result
+        if out is None and kind == "reg" and all(np.size(value) < self.PLAN_MIN_SIZE for value in values):
+            with np.errstate(all="ignore"):
+                result = self.function(*values)
+            if isinstance(result, np.ndarray):
+                return result
+            # same skalary na wejsciu
+            return np.asarray(result, dtype=float)
+
+        shapes = tuple(np.shape(value) for value in values)
+        plan = self.get_plan(shapes)
+        steps, slot_shapes, constants, result_slot = plan
+
+        storage = [np.empty(shape) for shape in slot_shapes]
+        if out is not None and kind == "reg":
+            # bufor wyniku ma ksztalt wyniku, wiec moze nim byc od razu out
+            storage[result_slot] = out
+        storage.extend(values)
+        storage.extend(constants)
+        with np.errstate(all="ignore"):
+            for ufunc, arguments, slot in steps:
+                ufunc(*[storage[i] for i in arguments], out=storage[slot])
+
+        if kind == "reg":
+            return storage[result_slot]
+        if out is None:
+            out = np.empty(np.broadcast_shapes(*shapes))
+        # wyrazenie bez dzialan: sama zmienna albo stala (np. "5")
+        out[...] = values[value] if kind == "var" else value
+        return out
+
+
+@functools.lru_cache(maxsize=None)
+def block_executor():
+
+    return concurrent.futures.ThreadPoolExecutor(max_workers=os.cpu_count() or 1,
+                                                 thread_name_prefix="scihlp-block")
+
+
+class BlockedExpression:
+    """Wyrazenie liczone blokami mieszczacymi sie w cache procesora, na kilku watkach.
+
+    Caly plan CompiledExpression przechodzi po jednym bloku, zanim zacznie sie
+    nastepny, wiec wyniki posrednie nie wychodza poza cache. Ufunci NumPy zwalniaja
+    GIL, wiec bloki moga liczyc sie rownolegle. Oplaca sie to tylko dla dluzszych
+    wyrazen (w bench_backends od ok. 4 skladnikow) - krotsze, ponizej MIN_INSTRUCTIONS
+    dzialan, licza sie od razu calym CompiledExpression. Domyslny rozmiar bloku
+    wynika z liczby buforow planu, tak zeby wszystkie miescily sie w CACHE_BYTES.
+    """
+
+    MIN_INSTRUCTIONS = 8
+    CACHE_BYTES = 1024 * 1024
+
+    def __init__(self, compiled, block_size=None):
+        self.compiled = compiled
+        self.source = compiled.source
+        self.variables = compiled.variables
+        if block_size is None:
+            # bufory posrednie planu + dane wejsciowe, po 8 bajtow na element
+            _, slot_shapes, _, _ = compiled.build_plan(((1,),) * len(compiled.variables))
+            arrays = len(slot_shapes) + len(compiled.variables)
+            block_size = max(4096, self.CACHE_BYTES // (8 * arrays) // 1024 * 1024)
+        self.block_size = block_size
+
+    def __call__(self, *values):
+
+        if len(self.compiled.instructions) < self.MIN_INSTRUCTIONS:
+            return self.compiled(*values)
+
+        shape = np.broadcast_shapes(*[np.shape(value) for value in values])
+        length = shape[-1] if shape else 0
+        rows = int(np.prod(shape[:-1])) if shape else 1
+        columns = max(1, self.block_size // max(rows, 1))
+        if length <= columns:
+            return self.compiled(*values)
+
+        out = np.empty(shape)
+
+        def run_block(start):
+            stop = start + columns
+            block_values = [
+                value[..., start:stop] if np.shape(value)[-1:] == (length,) else value
+                for value in values
+            ]
+            self.compiled(*block_values, out=out[..., start:stop])
+
+        for _ in block_executor().map(run_block, range(0, length, columns)):
+            pass
+        return out
+
+
+NUMEXPR_FUNCTIONS = {
+    "sin": "sin", "cos": "cos", "tan": "tan",
+    "arcsin": "arcsin", "arccos": "arccos", "arctan": "arctan",
+    "asin": "arcsin", "acos": "arccos", "atan": "arctan",
+    "sinh": "sinh", "cosh": "cosh", "tanh": "tanh",
+    "arcsinh": "arcsinh", "arccosh": "arccosh", "arctanh": "arctanh",
+    "exp": "exp", "expm1": "expm1",
+    "log": "log", "log10": "log10", "log1p": "log1p",
+    "sqrt": "sqrt", "abs": "abs", "arctan2": "arctan2",
+}
+# % i // licza sie w numexpr inaczej niz w NumPy dla liczb ujemnych
+NUMEXPR_OPERATORS = {ast.Add: "+", ast.Sub: "-", ast.Mult: "*", ast.Div: "/", ast.Pow: "**"}
+
+
+def numexpr_source(node, variables):
+    """Tekst wyrazenia dla numexpr.evaluate; zmienne nazywane v0, v1, ..."""
+    if isinstance(node, ast.Expression):
+        return numexpr_source(node.body, variables)
+    if isinstance(node, ast.Constant):
+        return repr(float(node.value))
+    if isinstance(node, ast.Name):
+        if node.id in variables:
+            return f"v{variables.index(node.id)}"
+        return repr(float(SAFE_CONSTANTS[node.id]))
+    if isinstance(node, ast.UnaryOp):
+        operand = numexpr_source(node.operand, variables)
+        return f"(-{operand})" if isinstance(node.op, ast.USub) else operand
+    if isinstance(node, ast.BinOp):
+        if type(node.op) not in NUMEXPR_OPERATORS:
+            raise ValueError(f"Unsupported operator for numexpr: {type(node.op).__name__}")
+        left = numexpr_source(node.left, variables)
+        right = numexpr_source(node.right, variables)
+        return f"({left} {NUMEXPR_OPERATORS[type(node.op)]} {right})"
+    if node.func.id not in NUMEXPR_FUNCTIONS:
+        raise ValueError(f"Unsupported function for numexpr: {node.func.id}")
+    arguments = ", ".join(numexpr_source(arg, variables) for arg in node.args)
+    return f"{NUMEXPR_FUNCTIONS[node.func.id]}({arguments})"
+
+
+class NumexprExpression:
+    """Wyrazenie liczone przez numexpr (jeden przebieg blokami, wiele watkow)"""
+
+    def __init__(self, compiled):
+        self.compiled = compiled
+        self.source = compiled.source
+        self.variables = compiled.variables
+        self.numexpr_source = numexpr_source(ast.parse(compiled.source, mode="eval"), compiled.variables)
+
+    def __call__(self, *values):
+
+        local_dict = {f"v{i}": np.asarray(value, dtype=float) for i, value in enumerate(values)}
+        result = numexpr.evaluate(self.numexpr_source, local_dict=local_dict)
+        shape = np.broadcast_shapes(*[np.shape(value) for value in values])
+        if np.shape(result) != shape:
+            result = np.array(np.broadcast_to(result, shape))
+        return result
+
+
+def available_backends():
+
+    backends = ["numpy", "blocked"]
+    if numexpr is not None:
+        backends.append("numexpr")
+    return backends
+
+
+@functools.lru_cache(maxsize=1024)
+def compile_normalized_expression(normalized, variables=("x",), backend="numpy"):
+
+    compiled = CompiledExpression(normalized, variables)
+    if backend == "blocked":
+        return BlockedExpression(compiled)
+    if backend == "numexpr" and numexpr is not None:
+        try:
+            return NumexprExpression(compiled)
+        except ValueError:
+            pass  # funkcja albo operator spoza numexpr, liczy NumPy
+    return compiled
+
+
+def compile_expression(source, variables=("x",), backend="numpy"):
+
+    return compile_normalized_expression(normalize_expression(source), tuple(variables), backend)
+
+
+def value_scale(y):
+    """Typowy rozrzut wartosci (bez ekstremow typu bieguny tan(x))"""
+    finite = y[np.isfinite(y)]
+    if not len(finite):
+        return 1.0
+    low, high = np.percentile(finite, [2, 98])
+    scale = high - low
+    return scale if scale > 0 else max(abs(high), 1.0)
+
+
+def interval_errors(x, y, scale):
+    """Blad interpolacji liniowej dla kazdego przedzialu [x[i], x[i+1]]"""
+    deviation = np.zeros_like(y)
+    with np.errstate(all="ignore"):
+        t = (x[1:-1] - x[:-2]) / (x[2:] - x[:-2])
+        linear = y[:-2] + t * (y[2:] - y[:-2])
+        deviation[1:-1] = np.abs(y[1:-1] - linear) / scale
+    deviation[~np.isfinite(deviation)] = 0
+
+    error = np.maximum(deviation[:-1], deviation[1:])
+
+    # granica dziedziny (np. log(x) w okolicy 0)
+    finite = np.isfinite(y)
+    error[finite[:-1] != finite[1:]] = np.inf
+    return error
+
+
+def find_discontinuities(x, y, scale, min_jump=0.02, slope_ratio=10):
+    """Indeksy przedzialow, w ktorych funkcja ma skok albo biegun"""
+    with np.errstate(all="ignore"):
+        dy = np.abs(np.diff(y))
+        slope = dy / np.diff(x)
+        neighbours = np.maximum(np.r_[0, slope[:-1]], np.r_[slope[1:], 0])
+
+        jump = (dy > min_jump * scale) & (slope > slope_ratio * neighbours)
+        # biegun: zmiana znaku przy wartosciach duzo wiekszych niz typowe
+        pole = (y[:-1] * y[1:] < 0) & (np.minimum(np.abs(y[:-1]), np.abs(y[1:])) > scale)
+
+    return np.flatnonzero(jump | pole)
+
+
+def adaptive_sample(function, x_min, x_max, max_points=1000, initial_points=33, tolerance=1e-3,
+                    max_depth=40):
+    """Probkowanie zageszczane tam, gdzie funkcja szybko sie zmienia.
+
+    Zwraca x, y; w miejscach nieciaglosci wstawiany jest NaN (przerwa w linii).
+    """
+    x = np.linspace(x_min, x_max, initial_points)
+    y = function(x)
+    min_width = (x_max - x_min) / (initial_points - 1) / 2 ** max_depth
+
+    while len(x) < max_points:
+        error = interval_errors(x, y, value_scale(y))
+        candidates = np.flatnonzero((error > tolerance) & (np.diff(x) > min_width))
+        if not len(candidates):
+            break
+
+        budget = max_points - len(x)
+        if len(candidates) > budget:
+            candidates = np.sort(candidates[np.argsort(error[candidates])[::-1][:budget]])
+
+        x_new = (x[candidates] + x[candidates + 1]) / 2
+        y_new = function(x_new)
+        x = np.insert(x, candidates + 1, x_new)
+        y = np.insert(y, candidates + 1, y_new)
+
+    breaks = find_discontinuities(x, y, value_scale(y))
+    if len(breaks):
+        x = np.insert(x, breaks + 1, (x[breaks] + x[breaks + 1]) / 2)
+        y = np.insert(y, breaks + 1, np.nan)
+
+    return x, y
+
+
+def parse_parameter_sweep(text):
+    """'a=1:50' albo 'a=0:1:0.1' -> ("a", tablica wartosci, koniec wlacznie)"""
+    match = re.fullmatch(r"\s*([A-Za-z_]\w*)\s*=\s*([^:]+):([^:]+?)(?::([^:]+))?\s*", text)
+    if not match:
+        raise ValueError("Parameter sweep must look like a=1:50 or a=0:1:0.1")
+
+    name, start, stop, step = match.groups()
+    if name == "x" or name in SAFE_FUNCTIONS or name in SAFE_CONSTANTS:
+        raise ValueError(f"{name} cannot be used as a parameter name")
+
+    start, stop = float(start), float(stop)
+    step = float(step) if step else 1.0
+    if step <= 0 or stop < start:
+        raise ValueError("Parameter sweep needs start <= stop and a positive step")
+
+    count = int(np.floor((stop - start) / step + 1e-9)) + 1
+    return name, start + step * np.arange(count)
+
+
+# kwadratura Gaussa-Kronroda G7/K15 (wezly i wagi jak w QUADPACK qk15)
+_KRONROD_NODES = np.array([
+    0.991455371120812639206854697526329, 0.949107912342758524526189684047851,
+    0.864864423359769072789712788640926, 0.741531185599394439863864773280788,
+    0.586087235467691130294144845693013, 0.405845151377397166906606412076961,
+    0.207784955007898467600689403773245, 0.0
+])
+_KRONROD_WEIGHTS = np.array([
+    0.022935322010529224963732008058970, 0.063092092629978553290700663189204,
+    0.104790010322250183839876322541518, 0.140653259715525918745189590510238,
+    0.169004726639267902826583426598550, 0.190350578064785409913256402421014,
+    0.204432940075298892414161999234649, 0.209482141084727828012999174891714
+])
+_GAUSS_WEIGHTS = np.array([
+    0.129484966168869693270611432679082, 0.279705391489276667901467771423780,
+    0.381830050505118944950369775488975, 0.417959183673469387755102040816327
+])
+K15_NODES = np.r_[-_KRONROD_NODES[:-1], _KRONROD_NODES[::-1]]
+K15_WEIGHTS = np.r_[_KRONROD_WEIGHTS[:-1], _KRONROD_WEIGHTS[::-1]]
+G7_WEIGHTS = np.zeros(15)
+G7_WEIGHTS[[1, 3, 5, 7, 9, 11, 13]] = np.r_[_GAUSS_WEIGHTS, _GAUSS_WEIGHTS[2::-1]]
+
+
+def brent_roots(function, a, b, fa, fb, tolerance=1e-12, max_iter=100):
+    """Metoda Brenta na wielu przedzialach naraz (fa * fb < 0 dla kazdego).
+
+    Kazda iteracja liczy funkcje raz, dla wszystkich jeszcze aktywnych przedzialow.
+    Zwraca przyblizenia pierwiastkow i wartosci funkcji w nich.
+    """
+    a, b, fa, fb = (np.array(value, dtype=float) for value in (a, b, fa, fb))
+    swap = np.abs(fa) < np.abs(fb)
+    a, b = np.where(swap, b, a), np.where(swap, a, b)
+    fa, fb = np.where(swap, fb, fa), np.where(swap, fa, fb)
+    c, fc = a.copy(), fa.copy()
+    d = np.zeros_like(a)
+    bisected = np.ones(len(a), dtype=bool)
+
+    for _ in range(max_iter):
+        delta = tolerance * (1 + np.abs(b))
+        active = (fb != 0) & (np.abs(b - a) > delta)
+        if not active.any():
+            break
+
+        with np.errstate(all="ignore"):
+            # interpolacja odwrotna kwadratowa albo sieczna
+            quadratic = (fa != fc) & (fb != fc)
+            s_quadratic = (a * fb * fc / ((fa - fb) * (fa - fc))
+                           + b * fa * fc / ((fb - fa) * (fb - fc))
+                           + c * fa * fb / ((fc - fa) * (fc - fb)))
+            s_secant = b - fb * (b - a) / (fb - fa)
+            s = np.where(quadratic, s_quadratic, s_secant)
+
+        low, high = np.minimum((3 * a + b) / 4, b), np.maximum((3 * a + b) / 4, b)
+        use_bisection = (
+            ~np.isfinite(s) | (s < low) | (s > high)
+            | (bisected & (np.abs(s - b) >= np.abs(b - c) / 2))
+            | (~bisected & (np.abs(s - b) >= np.abs(c - d) / 2))
+            | (bisected & (np.abs(b - c) < delta))
+            | (~bisected & (np.abs(c - d) < delta))
+        )
+        s = np.where(use_bisection, (a + b) / 2, s)
+        bisected = np.where(active, use_bisection, bisected)
+
+        fs = fb.copy()
+        fs[active] = function(s[active])
+
+        d = np.where(active, c, d)
+        c, fc = np.where(active, b, c), np.where(active, fb, fc)
+        replace_b = active & (fa * fs < 0)
+        replace_a = active & ~replace_b
+        b, fb = np.where(replace_b, s, b), np.where(replace_b, fs, fb)
+        a, fa = np.where(replace_a, s, a), np.where(replace_a, fs, fa)
+
+        swap = active & (np.abs(fa) < np.abs(fb))
+        a, b = np.where(swap, b, a), np.where(swap, a, b)
+        fa, fb = np.where(swap, fb, fa), np.where(swap, fa, fb)
+
+    return b, fb
+
+
+def golden_section_minimize(function, a, b, tolerance=1e-10, max_iter=200):
+    """Minimum funkcji na wielu przedzialach [a, b] naraz (zloty podzial)"""
+    ratio = (np.sqrt(5) - 1) / 2
+    a, b = np.array(a, dtype=float), np.array(b, dtype=float)
+    c, d = b - ratio * (b - a), a + ratio * (b - a)
+    fc, fd = function(c), function(d)
+
+    for _ in range(max_iter):
+        if np.all(b - a <= tolerance * (1 + np.abs(a))):
+            break
+        left = ~(fc > fd)
+        a, b = np.where(left, a, c), np.where(left, d, b)
+        point = np.where(left, b - ratio * (b - a), a + ratio * (b - a))
+        f_point = function(point)
+        c, fc, d, fd = (
+            np.where(left, point, d), np.where(left, f_point, fd),
+            np.where(left, c, point), np.where(left, fc, f_point),
+        )
+
+    x = (a + b) / 2
+    return x, function(x)
+
+
+def gauss_kronrod_integrate(function, a, b, tolerance=1e-10, initial_intervals=16, max_intervals=100000):
+    """Calka adaptacyjna G7/K15; wszystkie podprzedzialy danego poziomu liczone jednym wywolaniem.
+
+    Zwraca (wartosc, oszacowanie bledu). ArithmeticError, gdy blad nie zszedl ponizej
+    tolerancji (np. calka rozbiezna jak tan(x) czy 1/x przez biegun).
+    """
+    if a == b:
+        return 0.0, 0.0
+
+    edges = np.linspace(a, b, initial_intervals + 1)
+    low, high = edges[:-1], edges[1:]
+    total = total_error = 0.0
+    scale = 1.0
+    converged = True
+
+    while len(low):
+        center, half = (low + high) / 2, (high - low) / 2
+        values = function(center[:, np.newaxis] + half[:, np.newaxis] * K15_NODES)
+        kronrod = half * (values @ K15_WEIGHTS)
+        error = np.abs(kronrod - half * (values @ G7_WEIGHTS))
+        if not np.all(np.isfinite(kronrod)):
+            raise ValueError("Function is not finite on the integration interval")
+
+        # tolerancja rozdzielona proporcjonalnie do szerokosci przedzialow
+        scale = max(scale, abs(total + kronrod.sum()))
+        allowed = tolerance * scale * (high - low) / abs(b - a)
+        done = (error <= allowed) | (half <= 1e-15 * (1 + np.abs(center)))
+        if len(low) * 2 > max_intervals:
+            converged = False
+            done[:] = True
+
+        total += kronrod[done].sum()
+        total_error += error[done].sum()
+        middle = center[~done]
+        low, high = np.r_[low[~done], middle], np.r_[middle, high[~done]]
+
+    # przedzialy skurczone do zera wokol bieguna tez sa "gotowe", ale ich blad zostaje w sumie
+    if not converged or total_error > tolerance * scale:
+        raise ArithmeticError(f"did not converge (estimate {total:.6g}, error estimate {total_error:.2g})")
+    return total, total_error
+
+
+def find_function_roots(function, x, y):
+    """Pierwiastki: zmiany znaku na siatce x, dokladnie metoda Brenta"""
+    with np.errstate(invalid="ignore"):
+        brackets = np.flatnonzero(y[:-1] * y[1:] < 0)
+    # ciag zer pod rzad (np. floor(x) na [0, 1)) to jeden pierwiastek, jego poczatek
+    zero = y == 0
+    exact = x[zero & ~np.r_[False, zero[:-1]]]
+    roots, values = brent_roots(function, x[brackets], x[brackets + 1], y[brackets], y[brackets + 1])
+
+    # zmiana znaku na biegunie (np. tan) nie jest pierwiastkiem
+    real = np.abs(values) <= 1e-6 * (1 + value_scale(y))
+    return np.sort(np.r_[exact, roots[real]])
+
+
+def find_function_extrema(function, x, y):
+    """Lokalne minima i maksima: zmiany znaku roznic na siatce, dokladnie zlotym podzialem"""
+    with np.errstate(invalid="ignore"):
+        dy = np.sign(np.diff(y))
+    # ekstremum w punkcie siatki albo miedzy dwoma punktami o rownej wartosci
+    single = np.flatnonzero(dy[:-1] * dy[1:] < 0) + 1
+    pair = np.flatnonzero((dy[:-2] * dy[2:] < 0) & (dy[1:-1] == 0)) + 1
+    candidates = np.r_[single, pair]
+    is_max = dy[candidates - 1] > 0
+    sign = np.where(is_max, -1.0, 1.0)
+    a, b = x[candidates - 1], x[np.r_[single + 1, pair + 2]]
+
+    x_best, _ = golden_section_minimize(lambda points: sign * function(points), a, b)
+    y_best = function(x_best)
+
+    # ekstremum na brzegu przedzialu albo daleko od wartosci z siatki to biegun lub skok
+    margin = 1e-6 * (b - a)
+    interior = (x_best > a + margin) & (x_best < b - margin) & np.isfinite(y_best)
+    with np.errstate(invalid="ignore"):
+        interior &= np.abs(y_best - y[candidates]) <= value_scale(y)
+    result = {}
+    for kind, mask in (("minima", interior & ~is_max), ("maxima", interior & is_max)):
+        order = np.argsort(x_best[mask])
+        result[kind] = (x_best[mask][order], y_best[mask][order])
+    return result
+
+
+def envelope_to_line(scan):
+    """Obwiednia min/max ze scan_chunks jako dane linii (dwa punkty na przedzial)"""
+    edges = scan["envelope_x"]
+    x = np.column_stack([edges[:-1], edges[1:]]).ravel()
+    y = np.column_stack([scan["envelope_min"], scan["envelope_max"]]).ravel()
+    return x, y
+
+
+class SampleCache:
+    """Pamiec LRU probek funkcji na rownomiernej siatce, ograniczona liczba bajtow.
+
+    Klucz to (znormalizowane wyrazenie, x_min, x_max, num_points). Zapytanie o
+    podzakres albo mniejsza rozdzielczosc jest obslugiwane wycinkiem z wiekszej
+    zapamietanej siatki, jesli jego punkty leza na tej siatce.
+    """
+
+    def __init__(self, max_bytes=PLOT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = collections.OrderedDict()
+        self.keys_by_expression = {}
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, expression, x_min, x_max, num_points):
+
+        key = (expression, x_min, x_max, num_points)
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+
+            for cached_key in self.keys_by_expression.get(expression, ()):
+                window = self.find_window(cached_key, x_min, x_max, num_points)
+                if window is not None:
+                    self.entries.move_to_end(cached_key)
+                    self.hits += 1
+                    x, y = self.entries[cached_key]
+                    return x[window], y[window]
+
+            self.misses += 1
+            return None
+
+    @staticmethod
+    def find_window(cached_key, x_min, x_max, num_points, tolerance=1e-6):
+        """Wycinek cached_x, ktory daje siatke linspace(x_min, x_max, num_points), albo None"""
+        _, cached_min, cached_max, cached_points = cached_key
+        if num_points < 2 or cached_points < 2 or cached_max <= cached_min:
+            return None
+
+        step = (cached_max - cached_min) / (cached_points - 1)
+        start = (x_min - cached_min) / step
+        stride = (x_max - x_min) / (num_points - 1) / step
+        if abs(start - round(start)) > tolerance or abs(stride - round(stride)) > tolerance:
+            return None
+
+        start, stride = int(round(start)), int(round(stride))
+        stop = start + (num_points - 1) * stride
+        if start < 0 or stride < 1 or stop > cached_points - 1:
+            return None
+        return slice(start, stop + 1, stride)
+
+    def put(self, expression, x_min, x_max, num_points, x, y):
+
+        key = (expression, x_min, x_max, num_points)
+        size = x.nbytes + y.nbytes
+        if size > self.max_bytes:
+            return
+
+        # wyniki sa wspoldzielone miedzy wywolaniami, nikt nie moze ich zmieniac
+        x.setflags(write=False)
+        y.setflags(write=False)
+        with self.lock:
+            if key in self.entries:
+                return
+            self.entries[key] = (x, y)
+            self.keys_by_expression.setdefault(expression, []).append(key)
+            self.size += size
+
+            while self.size > self.max_bytes:
+                old_key, (old_x, old_y) = self.entries.popitem(last=False)
+                self.keys_by_expression[old_key[0]].remove(old_key)
+                if not self.keys_by_expression[old_key[0]]:
+                    del self.keys_by_expression[old_key[0]]
+                self.size -= old_x.nbytes + old_y.nbytes
+
+    def clear(self):
+
+        with self.lock:
+            self.entries.clear()
+            self.keys_by_expression.clear()
+            self.size = 0
+
+    def stats(self):
+
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self.entries),
+                "bytes": self.size,
+            }
+
+
 class PlotModel:
     """Model odpowiedzialny za logikę rysowania wykresów"""
 
@@ -168,61 +1976,857 @@ class PlotModel:
         self.x_min = -10
         self.x_max = 10
         self.num_points = 1000
-
-    def generate_function_data(self, function_string):
-        """Generuje dane dla podanej funkcji"""
+        self.sampling = "uniform"  # albo "adaptive"
+        # powyzej tej liczby probek wykres powstaje strumieniowo (obwiednia min/max)
+        self.max_dense_points = 2000000
+        self.chunk_size = 65536
+        self.envelope_bins = 4000
+        self.backend = EVALUATION_BACKEND
+        self.cache = SampleCache()
+
+    def set_backend(self, backend):
+
+        if backend not in ("numpy", "blocked", "numexpr"):
+            return False, f"Unknown backend: {backend}"
+        self.backend = backend
+        if backend not in available_backends():
+            return False, f"Backend '{backend}' is not available, using NumPy"
+        return True, f"Using backend '{backend}'"
+
+    def generate_function_data(self, function_string, sampling=None, x_min=None, x_max=None, num_points=None):
+        """Generuje dane dla podanej funkcji (domyslnie na calej dziedzinie modelu)"""
         if not function_string.strip():
             return None, None, "Empty function"
 
+        sampling = sampling or self.sampling
+        x_min = self.x_min if x_min is None else x_min
+        x_max = self.x_max if x_max is None else x_max
+        num_points = num_points or self.num_points
         try:
+            if sampling == "uniform" and num_points <= self.max_dense_points:
+                x, y = self.sample_uniform(function_string, x_min, x_max, num_points)
+                return x, y, None
+
+            function = compile_expression(function_string, backend=self.backend)
+            if sampling == "uniform":
+                scan = self.scan_chunks(function, x_min, x_max, num_points)
+                x, y = envelope_to_line(scan)
+            elif sampling == "adaptive":
+                # num_points jest tu gornym limitem liczby probek
+                x, y = adaptive_sample(function, x_min, x_max, num_points)
+            else:
+                raise ValueError(f"Unknown sampling mode: {sampling}")
+
+            return x, y, None
+        except SyntaxError as e:
+            return None, None, f"Invalid syntax: {e.msg}"
+        except Exception as e:
+            return None, None, str(e)
 
-            x = np.linspace(self.x_min, self.x_max, self.num_points)
+    def sample_uniform(self, function_string, x_min, x_max, num_points):
+        """Probki na siatce linspace, z pamieci podrecznej jesli to mozliwe"""
+        expression = normalize_expression(function_string)
+        x_min, x_max, num_points = float(x_min), float(x_max), int(num_points)
 
+        cached = self.cache.get(expression, x_min, x_max, num_points)
+        if cached is not None:
+            return cached
 
-            safe_function = self.prepare_safe_function(function_string)
+        function = compile_normalized_expression(expression, ("x",), self.backend)
+        x = np.linspace(x_min, x_max, num_points)
+        y = function(x)
+        self.cache.put(expression, x_min, x_max, num_points, x, y)
+        return x, y
+
+    def generate_batch_data(self, function_strings, parameters=None, x_min=None, x_max=None, num_points=None):
+        """Liczy wiele funkcji (i/lub przebieg parametru) na wspolnej siatce x.
+
+        parameters: {nazwa: wartosci}, wszystkie tej samej dlugosci. Kazde wyrazenie
+        jest liczone jednym wywolaniem z parametrami jako kolumna (k, 1), wiec wynik
+        (k, n) powstaje przez broadcasting, bez petli po wartosciach parametru.
+        Zwraca x, ys (wiersz na krzywa), etykiety, blad.
+        """
+        function_strings = [source for source in function_strings if source.strip()]
+        if not function_strings:
+            return None, None, None, "Empty function"
+
+        parameters = parameters or {}
+        x_min = self.x_min if x_min is None else x_min
+        x_max = self.x_max if x_max is None else x_max
+        num_points = num_points or self.num_points
+        try:
+            names = tuple(parameters)
+            values = [np.asarray(parameters[name], dtype=float) for name in names]
+            sweep = len(values[0]) if values else 1
+            if any(len(value) != sweep for value in values):
+                raise ValueError("All parameters must have the same number of values")
+
+            functions = [compile_expression(source, ("x",) + names, self.backend) for source in function_strings]
+
+            x = np.linspace(x_min, x_max, num_points)
+            columns = [value[:, np.newaxis] for value in values]
+            ys = np.empty((len(functions) * sweep, num_points))
+            for i, function in enumerate(functions):
+                ys[i * sweep:(i + 1) * sweep] = function(x, *columns)
+
+            labels = []
+            for source in function_strings:
+                for row in range(sweep):
+                    assignments = ", ".join(f"{name}={value[row]:g}" for name, value in zip(names, values))
+                    labels.append(f"{source} ({assignments})" if assignments else source)
+
+            return x, ys, labels, None
+        except SyntaxError as e:
+            return None, None, None, f"Invalid syntax: {e.msg}"
+        except Exception as e:
+            return None, None, None, str(e)
+
+    def iter_function_chunks(self, function, x_min, x_max, num_points, chunk_size=None):
+        """Generator (x, y) dla kolejnych kawalkow siatki linspace(x_min, x_max, num_points)"""
+        chunk_size = chunk_size or self.chunk_size
+        step = (x_max - x_min) / (num_points - 1) if num_points > 1 else 0.0
+
+        for start in range(0, num_points, chunk_size):
+            stop = min(start + chunk_size, num_points)
+            x = x_min + np.arange(start, stop) * step
+            if stop == num_points:
+                x[-1] = x_max
+            yield x, function(x)
+
+    def scan_chunks(self, function, x_min, x_max, num_points, max_roots=10000):
+        """Redukuje funkcje kawalek po kawalku, pamiec nie zalezy od num_points"""
+        bins = min(self.envelope_bins, num_points)
+        scan = {
+            "num_points": num_points,
+            "count": 0,
+            "min": np.nan, "x_at_min": np.nan,
+            "max": np.nan, "x_at_max": np.nan,
+            "mean": np.nan, "std": np.nan,
+            "sign_changes": 0,
+            "crossings": [],
+            "envelope_x": np.linspace(x_min, x_max, bins + 1),
+            "envelope_min": np.full(bins, np.nan),
+            "envelope_max": np.full(bins, np.nan),
+        }
+        mean = m2 = 0.0
+        previous_x = previous_y = None
+        offset = 0
+
+        for x, y in self.iter_function_chunks(function, x_min, x_max, num_points):
+            finite = np.isfinite(y)
+            values = y[finite]
+
+            if len(values):
+                # min/max z pozycja
+                i_min, i_max = np.argmin(values), np.argmax(values)
+                if not values[i_min] >= scan["min"]:
+                    scan["min"], scan["x_at_min"] = values[i_min], x[finite][i_min]
+                if not values[i_max] <= scan["max"]:
+                    scan["max"], scan["x_at_max"] = values[i_max], x[finite][i_max]
+
+                # srednia i wariancja laczone kawalkami (Chan i in.)
+                n_a, n_b = scan["count"], len(values)
+                mean_b = values.mean()
+                m2_b = np.sum((values - mean_b) ** 2)
+                delta = mean_b - mean
+                scan["count"] = n_a + n_b
+                mean += delta * n_b / scan["count"]
+                m2 += m2_b + delta ** 2 * n_a * n_b / scan["count"]
+
+            # obwiednia: kazdy kawalek to ciagly zakres przedzialow obwiedni
+            index = np.arange(offset, offset + len(y))
+            bin_index = index * bins // num_points
+            starts = np.flatnonzero(np.r_[True, bin_index[1:] != bin_index[:-1]])
+            chunk_bins = bin_index[starts]
+            scan["envelope_min"][chunk_bins] = np.fmin(scan["envelope_min"][chunk_bins], np.fmin.reduceat(y, starts))
+            scan["envelope_max"][chunk_bins] = np.fmax(scan["envelope_max"][chunk_bins], np.fmax.reduceat(y, starts))
+
+            # zmiany znaku, razem z granica miedzy kawalkami
+            if previous_y is not None:
+                xs, ys = np.r_[previous_x, x], np.r_[previous_y, y]
+            else:
+                xs, ys = x, y
+            with np.errstate(all="ignore"):
+                change = np.flatnonzero(ys[:-1] * ys[1:] < 0)
+                zeros = np.flatnonzero(ys[1:] == 0) + 1 if previous_y is not None else np.flatnonzero(ys == 0)
+                crossing_x = xs[change] - ys[change] * (xs[change + 1] - xs[change]) / (ys[change + 1] - ys[change])
+            scan["sign_changes"] += len(change) + len(zeros)
+            room = max_roots - len(scan["crossings"])
+            if room > 0:
+                found = np.sort(np.r_[crossing_x, xs[zeros]])
+                scan["crossings"].extend(found[:room].tolist())
+
+            previous_x, previous_y = x[-1], y[-1]
+            offset += len(y)
+
+        if scan["count"]:
+            scan["mean"] = mean
+            scan["std"] = np.sqrt(m2 / scan["count"])
+        return scan
+
+    def scan_function(self, function_string, x_min=None, x_max=None, num_points=None):
+        """Statystyki funkcji liczone strumieniowo; zwraca (slownik, blad)"""
+        if not function_string.strip():
+            return None, "Empty function"
 
+        x_min = self.x_min if x_min is None else x_min
+        x_max = self.x_max if x_max is None else x_max
+        num_points = num_points or self.num_points
+        try:
+            function = compile_expression(function_string, backend=self.backend)
+            return self.scan_chunks(function, x_min, x_max, num_points), None
+        except SyntaxError as e:
+            return None, f"Invalid syntax: {e.msg}"
+        except Exception as e:
+            return None, str(e)
 
-            y = eval(safe_function)
+    def analyze_function(self, function_string, x_min=None, x_max=None, num_points=None):
+        """Pierwiastki, ekstrema lokalne i calka oznaczona na [x_min, x_max]; zwraca (slownik, blad)"""
+        if not function_string.strip():
+            return None, "Empty function"
 
-            return x, y, None
+        x_min = self.x_min if x_min is None else x_min
+        x_max = self.x_max if x_max is None else x_max
+        num_points = num_points or self.num_points
+        try:
+            function = compile_expression(function_string, backend=self.backend)
+            x = np.linspace(x_min, x_max, num_points)
+            y = function(x)
+
+            result = {"x_min": x_min, "x_max": x_max, "roots": find_function_roots(function, x, y)}
+            result.update(find_function_extrema(function, x, y))
+            # integral None - calka nie istnieje albo sie nie zbiega, powod w integral_error
+            try:
+                result["integral"] = gauss_kronrod_integrate(function, x_min, x_max)
+            except ValueError:
+                result["integral"], result["integral_error"] = None, "does not exist (function is not finite)"
+            except ArithmeticError as e:
+                result["integral"], result["integral_error"] = None, str(e)
+            return result, None
+        except SyntaxError as e:
+            return None, f"Invalid syntax: {e.msg}"
         except Exception as e:
-            return None, None, str(e)
+            return None, str(e)
+
+    def get_default_data(self, x_min=None, x_max=None):
+        x_min = self.x_min if x_min is None else x_min
+        x_max = self.x_max if x_max is None else x_max
+        return self.sample_uniform("sin(x)", x_min, x_max, self.num_points)
+
+
+class BackgroundRunner:
+    """Wykonuje funkcje w puli watkow i oddaje wynik do watku Tk przez after().
+
+    Zadania maja klucz: nowe zadanie z tym samym kluczem uniewaznia poprzednie
+    (jego wynik jest wyrzucany, a jesli jeszcze nie wystartowalo - anulowane).
+    Numpy zwalnia GIL w ufuncach, wiec watki wystarczaja do liczenia wykresow.
+    """
+
+    def __init__(self, widget, max_workers=2, timeout=10.0, poll_interval=20):
+        self.widget = widget
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="scihlp")
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.generations = {}
+        self.futures = {}
+
+    def submit(self, key, on_done, on_error, function, *args, **kwargs):
+
+        self.cancel(key)
+        generation = self.generations[key]
+        future = self.executor.submit(function, *args, **kwargs)
+        self.futures[key] = future
+        self.widget.after(self.poll_interval, self.poll, key, generation, future, time.monotonic(),
+                          on_done, on_error)
+
+    def stream(self, key, on_item, on_done, on_error, function, *args, **kwargs):
+        """Jak submit, ale function zwraca iterator; kazdy element trafia do on_item zaraz po policzeniu.
+
+        Calosc nie ma limitu czasu, a anulowanie konczy iteracje przy nastepnym elemencie.
+        """
+        self.cancel(key)
+        generation = self.generations[key]
+        items = queue.Queue()
+
+        def run():
+            iterator = iter(function(*args, **kwargs))
+            try:
+                for item in iterator:
+                    if self.generations.get(key) != generation:
+                        break
+                    items.put(item)
+            finally:
+                if hasattr(iterator, "close"):
+                    iterator.close()
+
+        future = self.executor.submit(run)
+        self.futures[key] = future
+        self.widget.after(self.poll_interval, self.poll_stream, key, generation, future, items,
+                          on_item, on_done, on_error)
+
+    def poll_stream(self, key, generation, future, items, on_item, on_done, on_error):
+
+        while self.generations.get(key) == generation:
+            try:
+                item = items.get_nowait()
+            except queue.Empty:
+                break
+            on_item(item)
 
-    def prepare_safe_function(self, function_str):
-        safe_function = function_str
-        safe_function = safe_function.replace("sin", "np.sin")
-        safe_function = safe_function.replace("cos", "np.cos")
-        safe_function = safe_function.replace("tan", "np.tan")
-        safe_function = safe_function.replace("exp", "np.exp")
-        safe_function = safe_function.replace("log", "np.log")
-        safe_function = safe_function.replace("sqrt", "np.sqrt")
-        return safe_function
-
-    def get_default_data(self):
-        x = np.linspace(self.x_min, self.x_max, self.num_points)
-        y = np.sin(x)
-        return x, y
+        if self.generations.get(key) != generation:
+            return
 
+        if future.done() and items.empty():
+            self.futures.pop(key, None)
+            try:
+                future.result()
+            except Exception as e:
+                on_error(str(e))
+                return
+            on_done()
+        else:
+            self.widget.after(self.poll_interval, self.poll_stream, key, generation, future, items,
+                              on_item, on_done, on_error)
 
-class WeatherModel:
+    def cancel(self, key):
 
+        self.generations[key] = self.generations.get(key, 0) + 1
+        future = self.futures.pop(key, None)
+        if future is not None:
+            future.cancel()
 
-    def __init__(self):
-        self.api_key = None  # place holder
+    def poll(self, key, generation, future, started, on_done, on_error):
+
+        if self.generations.get(key) != generation:
+            return
+
+        if future.done():
+            self.futures.pop(key, None)
+            try:
+                result = future.result()
+            except Exception as e:
+                on_error(str(e))
+                return
+            on_done(result)
+        elif time.monotonic() - started > self.timeout:
+            # watku nie da sie przerwac, jego wynik zostanie po prostu zignorowany
+            self.cancel(key)
+            on_error(f"Timed out after {self.timeout:g} s")
+        else:
+            self.widget.after(self.poll_interval, self.poll, key, generation, future, started, on_done, on_error)
+
+    def cancel_all(self):
+
+        for key in list(self.generations):
+            self.cancel(key)
+
+    def shutdown(self):
+
+        # cancel_all odwoluje wszystkie zlecone zadania (shutdown(cancel_futures=) jest dopiero od 3.9)
+        self.cancel_all()
+        self.executor.shutdown(wait=False)
+
+
+def create_http_session(pool_size=WEATHER_MAX_CONCURRENCY):
+    """Sesja HTTP z pula polaczen keep-alive, wspoldzielona przez watki"""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def is_transient_error(error):
+    """Bledy, po ktorych warto sprobowac ponownie (siec, przeciazenie serwera)"""
+    if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+        return True
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        return error.response.status_code == 429 or error.response.status_code >= 500
+    return False
+
+
+class WeatherCacheStore:
+    """Ostatnia odpowiedz API pogody dla kazdego miejsca, w bazie SQLite"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS weather (
+            key TEXT PRIMARY KEY,
+            data TEXT NOT NULL,
+            fetched_at REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS pinned (
+            key TEXT PRIMARY KEY,
+            location TEXT NOT NULL
+        );
+    """
+
+    UPSERT_WEATHER = (
+        "INSERT INTO weather (key, data, fetched_at) VALUES (?, ?, ?) "
+        "ON CONFLICT(key) DO UPDATE SET data = excluded.data, fetched_at = excluded.fetched_at"
+    )
+
+    def __init__(self, db_file=WEATHER_CACHE_FILE, max_age=WEATHER_CACHE_MAX_AGE):
+        self.db_file = db_file
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(db_file, timeout=10, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(self.SCHEMA)
+
+    def load(self):
+
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM weather WHERE fetched_at < ?", (time.time() - self.max_age,))
+            rows = self.connection.execute("SELECT key, data FROM weather ORDER BY fetched_at").fetchall()
+        return {key: json.loads(data) for key, data in rows}
+
+    def put(self, key, data):
+
+        with self.lock, self.connection:
+            self.connection.execute(self.UPSERT_WEATHER, (key, json.dumps(data), data["fetched_at"]))
+
+    def load_pinned(self):
+
+        with self.lock:
+            return self.connection.execute("SELECT key, location FROM pinned ORDER BY rowid").fetchall()
+
+    def set_pinned(self, key, location, pinned):
+
+        with self.lock, self.connection:
+            if pinned:
+                self.connection.execute("INSERT OR REPLACE INTO pinned (key, location) VALUES (?, ?)", (key, location))
+            else:
+                self.connection.execute("DELETE FROM pinned WHERE key = ?", (key,))
+
+    def close(self):
+
+        with self.lock:
+            self.connection.close()
+
+
+# metryka -> miejsce w odpowiedzi API
+WEATHER_METRICS = {
+    "temp": ("main", "temp"),
+    "humidity": ("main", "humidity"),
+    "pressure": ("main", "pressure"),
+    "wind": ("wind", "speed"),
+}
+
+
+def rolling_mean(t, values, window):
+    """Srednia z okna czasowego (t - window, t] dla kazdego pomiaru (t posortowane, NaN pomijane)"""
+    valid = np.isfinite(values)
+    sums = np.concatenate([[0.0], np.cumsum(np.where(valid, values, 0.0))])
+    counts = np.concatenate([[0], np.cumsum(valid)])
+    starts = np.searchsorted(t, t - window, side="right")
+    ends = np.arange(1, len(t) + 1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return (sums[ends] - sums[starts]) / (counts[ends] - counts[starts])
+
+
+def downsample(t, values, bucket):
+    """Poczatki przedzialow czasu dlugosci bucket oraz min, srednia i max pomiarow w kazdym"""
+    if not len(t):
+        return t, values, values, values
+
+    index = np.floor((t - t[0]) / bucket).astype(np.int64)
+    starts = np.flatnonzero(np.r_[True, index[1:] != index[:-1]])
+    valid = np.isfinite(values)
+    counts = np.add.reduceat(valid, starts)
+    sums = np.add.reduceat(np.where(valid, values, 0.0), starts)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = sums / counts
+    low = np.fmin.reduceat(values, starts)
+    high = np.fmax.reduceat(values, starts)
+    return t[0] + index[starts] * bucket, low, mean, high
+
+
+class WeatherHistory:
+    """Historia pomiarow pogody: kolumny NumPy (czas + metryki) w kawalkach na dysku.
+
+    Dla kazdego miejsca nowe pomiary sa dopisywane do tail.bin (rekordy float64),
+    a co chunk_size pomiarow przepisywane do niezmiennego kawalka chunk_NNNNNN.bin,
+    w ktorym kolumny (float64) leza jedna za druga - kazda czyta sie przez memmap
+    bez dotykania pozostalych.
+    """
+
+    COLUMNS = ("time",) + tuple(WEATHER_METRICS)
+    RECORD = np.dtype([(name, "<f8") for name in COLUMNS])
+
+    def __init__(self, directory=WEATHER_HISTORY_DIR, chunk_size=4096):
+        self.directory = directory
+        self.chunk_size = chunk_size
+        self.lock = threading.Lock()
+        self.tails = {}
+        self.chunk_times = {}  # sciezka kawalka -> (pierwszy, ostatni czas)
+
+    def location_dir(self, key):
+
+        return os.path.join(self.directory, urllib.parse.quote(key, safe=""))
+
+    def chunk_paths(self, key):
+
+        directory = self.location_dir(key)
+        if not os.path.isdir(directory):
+            return []
+        names = sorted(name for name in os.listdir(directory) if name.startswith("chunk_") and name.endswith(".bin"))
+        return [os.path.join(directory, name) for name in names]
+
+    def open_chunk(self, path):
+
+        return np.memmap(path, dtype="<f8", mode="r").reshape(len(self.COLUMNS), -1)
+
+    def get_chunk_times(self, path):
+
+        if path not in self.chunk_times:
+            times = self.open_chunk(path)[0]
+            self.chunk_times[path] = (times[0], times[-1])
+        return self.chunk_times[path]
+
+    def load_tail(self, key):
+
+        if key not in self.tails:
+            path = os.path.join(self.location_dir(key), "tail.bin")
+            raw = b""
+            if os.path.exists(path):
+                with open(path, "rb") as f:
+                    raw = f.read()
+            # niedokonczony ostatni rekord (przerwany zapis) jest pomijany
+            usable = len(raw) - len(raw) % self.RECORD.itemsize
+            tail = np.frombuffer(raw[:usable], dtype=self.RECORD).copy()
+
+            # po przerwanym zamykaniu kawalka te same pomiary moga byc tez w tail.bin
+            paths = self.chunk_paths(key)
+            if paths:
+                tail = tail[tail["time"] > self.get_chunk_times(paths[-1])[1]]
+            self.tails[key] = tail
+        return self.tails[key]
+
+    def append(self, key, data):
+
+        row = np.zeros(1, dtype=self.RECORD)
+        row["time"] = data["fetched_at"]
+        for metric, (group, field) in WEATHER_METRICS.items():
+            row[metric] = data.get(group, {}).get(field, np.nan)
+        self.extend(key, row)
+
+    def extend(self, key, rows):
+        """Dopisuje pomiary (tablica RECORD) i zamyka pelne kawalki"""
+        with self.lock:
+            directory = self.location_dir(key)
+            os.makedirs(directory, exist_ok=True)
+            tail_path = os.path.join(directory, "tail.bin")
+
+            tail = np.concatenate([self.load_tail(key), rows])
+            if len(tail) < self.chunk_size:
+                with open(tail_path, "ab") as f:
+                    f.write(rows.tobytes())
+                self.tails[key] = tail
+                return
+
+            while len(tail) >= self.chunk_size:
+                self.write_chunk(key, tail[:self.chunk_size])
+                tail = tail[self.chunk_size:]
+            with open(tail_path + ".tmp", "wb") as f:
+                f.write(tail.tobytes())
+            os.replace(tail_path + ".tmp", tail_path)
+            self.tails[key] = tail
+
+    def write_chunk(self, key, rows):
+
+        path = os.path.join(self.location_dir(key), f"chunk_{len(self.chunk_paths(key)):06d}.bin")
+        with open(path + ".tmp", "wb") as f:
+            f.write(np.stack([rows[name] for name in self.COLUMNS]).astype("<f8").tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+        self.chunk_times[path] = (rows["time"][0], rows["time"][-1])
+
+    def query(self, key, columns=COLUMNS, start=None, end=None):
+        """Kolumny pomiarow z przedzialu czasu [start, end], posortowane po czasie"""
+        start = -np.inf if start is None else start
+        end = np.inf if end is None else end
+        columns = ("time",) + tuple(name for name in columns if name != "time")
+
+        parts = []
+        with self.lock:
+            for path in self.chunk_paths(key):
+                first, last = self.get_chunk_times(path)
+                if last < start or first > end:
+                    continue
+                chunk = self.open_chunk(path)
+                parts.append({name: np.array(chunk[self.COLUMNS.index(name)]) for name in columns})
+            tail = self.load_tail(key)
+            parts.append({name: tail[name] for name in columns})
+
+        result = {name: np.concatenate([part[name] for part in parts]) for name in columns}
+        order = np.argsort(result["time"], kind="stable")
+        times = result["time"][order]
+        keep = order[(times >= start) & (times <= end)]
+        return {name: values[keep] for name, values in result.items()}
+
+
+class WeatherModel:
+    """Klient API pogody (format OpenWeatherMap) z pamiecia wynikow na cache_ttl sekund.
+
+    Rownoczesne zapytania o to samo miejsce czekaja na jedno wywolanie HTTP.
+    Bez klucza API zwracane sa dane symulowane ("simulated": True), ktore nie trafiaja
+    do store ani do history. Z store wyniki przetrwaja restart;
+    w trybie offline zwracane sa tylko zapamietane dane, niezaleznie od wieku.
+    Kazda odpowiedz ma dopisany czas pobrania "fetched_at" (sekundy epoki).
+    """
+
+    def __init__(self, api_key=WEATHER_API_KEY, api_url=WEATHER_API_URL, cache_ttl=WEATHER_CACHE_TTL,
+                 timeout=5.0, session=None, store=None, offline=False, history=None):
+        self.api_key = api_key
+        self.api_url = api_url
+        self.cache_ttl = cache_ttl
+        self.timeout = timeout
+        self.session = session if session is not None else create_http_session()
+        self.store = store
+        self.offline = offline
+        self.history = history
+        self.cache = store.load() if store is not None else {}
+        self.in_flight = {}
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.retries = 0
+        self.stale = 0
+        self.latencies = collections.deque(maxlen=1000)
+
+    @staticmethod
+    def location_key(location):
+
+        return " ".join(location.split()).lower()
 
     def fetch_weather_for_location(self, location):
 
-        if not location.strip():
+        try:
+            return self.get_weather(location)
+        except Exception:
             return None
 
+    def get_weather(self, location, max_age=None):
+        """Dane pogodowe; max_age (sekundy) zastepuje cache_ttl, np. 0 wymusza zapytanie"""
+        key = self.location_key(location)
+        if not key:
+            raise ValueError("Empty location")
+
+        with self.lock:
+            cached = self.cache.get(key)
+            if cached is not None and (self.offline or self.is_fresh(cached, max_age)):
+                self.hits += 1
+                return cached
+            if self.offline:
+                self.misses += 1
+                raise LookupError(f"No saved weather data for {location.strip()} (offline mode)")
+
+            future = self.in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = self.in_flight[key] = concurrent.futures.Future()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            return future.result()
+
+        try:
+            data = self.request_weather(location.strip())
+        except Exception as e:
+            with self.lock:
+                self.errors += 1
+                del self.in_flight[key]
+            future.set_exception(e)
+            raise
+
+        data["fetched_at"] = time.time()
+        with self.lock:
+            self.cache[key] = data
+            del self.in_flight[key]
+        future.set_result(data)
+
+        # losowe dane bez klucza API nie moga wrocic po restarcie jako ostatnie prawdziwe
+        # ani trafic do historii pomiarow
+        if data.get("simulated"):
+            return data
+        if self.store is not None:
+            try:
+                self.store.put(key, data)
+            except sqlite3.Error:
+                pass  # pamiec podreczna na dysku jest tylko dodatkiem
+        if self.history is not None:
+            try:
+                self.history.append(key, data)
+            except OSError:
+                pass
+        return data
+
+    def is_fresh(self, data, max_age=None):
+
+        return time.time() - data["fetched_at"] < (self.cache_ttl if max_age is None else max_age)
+
+    def get_cached_weather(self, location):
+        """Ostatnie znane dane dla miejsca (dowolnie stare) albo None"""
+        with self.lock:
+            return self.cache.get(self.location_key(location))
+
+    def get_last_weather(self):
+        """(miejsce, dane) ostatnio pobranej pogody albo (None, None)"""
+        with self.lock:
+            if not self.cache:
+                return None, None
+            key = max(self.cache, key=lambda key: self.cache[key]["fetched_at"])
+            return key, self.cache[key]
+
+    def set_offline(self, offline):
+
+        self.offline = offline
+
+    def get_weather_with_retry(self, location, retries=WEATHER_RETRIES, backoff=0.5, max_age=None):
+
+        for attempt in range(retries + 1):
+            try:
+                return self.get_weather(location, max_age)
+            except Exception as e:
+                if not is_transient_error(e):
+                    raise
+                if attempt == retries:
+                    # API nie odpowiada - lepsze starsze dane niz zadne
+                    cached = self.get_cached_weather(location)
+                    if cached is None:
+                        raise
+                    with self.lock:
+                        self.stale += 1
+                    return cached
+                with self.lock:
+                    self.retries += 1
+                # wykladnicze odstepy z losowym rozrzutem, zeby ponowienia nie szly naraz
+                time.sleep(backoff * 2 ** attempt * random.uniform(0.5, 1.5))
+
+    def iter_weather_batch(self, locations, max_concurrency=WEATHER_MAX_CONCURRENCY, retries=WEATHER_RETRIES,
+                           backoff=0.5):
+        """Pobiera pogode dla wielu miejsc naraz.
+
+        Zwraca (miejsce, dane, blad) w kolejnosci naplywania odpowiedzi. Najwyzej
+        max_concurrency zapytan jest w toku; zamkniecie generatora anuluje reszte.
+        Miejsca z nieaktualnymi danymi w pamieci sa zwracane od razu z tymi danymi,
+        a potem drugi raz, juz odswiezone.
+        """
+        # powtorzone miejsce (inna wielkosc liter, spacje) to jeden wiersz i jedno zapytanie
+        unique = {}
+        for location in locations:
+            if self.location_key(location):
+                unique.setdefault(self.location_key(location), location.strip())
+        locations = list(unique.values())
+        if not self.offline:
+            for location in locations:
+                cached = self.get_cached_weather(location)
+                if cached is not None and not self.is_fresh(cached):
+                    yield location, cached, None
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_concurrency,
+                                                         thread_name_prefix="scihlp-weather")
+        futures = {}
         try:
+            for location in locations:
+                futures[executor.submit(self.get_weather_with_retry, location, retries, backoff)] = location
+            for future in concurrent.futures.as_completed(futures):
+                location = futures[future]
+                try:
+                    yield location, future.result(), None
+                except Exception as e:
+                    yield location, None, str(e)
+        finally:
+            # przerwana iteracja: zapytania jeszcze nie rozpoczete nie ida do API
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+    def request_weather(self, location):
+
+        if not self.api_key:
             return self.simulate_weather_response(location)
-        except Exception:
-            return None
 
-    def simulate_weather_response(self, location):
+        start = time.perf_counter()
+        try:
+            response = self.session.get(
+                self.api_url,
+                params={"q": location, "appid": self.api_key, "units": "metric"},
+                timeout=self.timeout
+            )
+            response.raise_for_status()
+        except requests.RequestException as e:
+            # komunikaty requests zawieraja URL, a w nim klucz API
+            raise type(e)(str(e).replace(self.api_key, "***"), response=e.response) from None
+        data = response.json()
+        self.latencies.append(time.perf_counter() - start)
+
+        if "main" not in data or "name" not in data:
+            raise ValueError(f"Unexpected weather response for {location}")
+        return data
+
+    def get_history_series(self, location, metric, start=None, end=None, max_points=500):
+        """Historia metryki jako krzywe do wykresu, x w godzinach wzgledem teraz.
+
+        Do max_points pomiarow: pomiary i srednia kroczaca, powyzej: min, srednia
+        i max w max_points przedzialach czasu. Zwraca x, ys, etykiety, blad.
+        """
+        if self.history is None:
+            return None, None, None, "Weather history is not enabled"
+        if metric not in WEATHER_METRICS:
+            return None, None, None, f"Unknown metric: {metric}"
+
+        columns = self.history.query(self.location_key(location), ("time", metric), start, end)
+        t, values = columns["time"], columns[metric]
+        if not len(t):
+            return None, None, None, f"No weather history for {location.strip()}"
+
+        now = time.time()
+        if len(t) <= max_points:
+            ys = np.vstack([values, rolling_mean(t, values, WEATHER_HISTORY_WINDOW)])
+            labels = [metric, f"{metric}, {WEATHER_HISTORY_WINDOW / 3600:g} h mean"]
+        else:
+            bucket = (t[-1] - t[0]) / max_points
+            t, low, mean, high = downsample(t, values, bucket)
+            ys = np.vstack([low, mean, high])
+            labels = [f"{metric} min", f"{metric} mean", f"{metric} max"]
+        return (t - now) / 3600, ys, labels, None
+
+    def clear_cache(self):
+
+        with self.lock:
+            self.cache.clear()
+
+    def stats(self):
+
+        with self.lock:
+            requests_total = self.hits + self.misses + self.coalesced
+            latencies = np.array(self.latencies)
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "errors": self.errors,
+                "retries": self.retries,
+                "stale": self.stale,
+                "hit_rate": (self.hits + self.coalesced) / requests_total if requests_total else 0.0,
+                "latency_mean_ms": float(latencies.mean() * 1e3) if len(latencies) else None,
+                "latency_p95_ms": float(np.percentile(latencies, 95) * 1e3) if len(latencies) else None,
+            }
 
-        import random
+    def close(self):
+
+        self.session.close()
+        if self.store is not None:
+            self.store.close()
+
+    def simulate_weather_response(self, location):
 
         return {
             "main": {
@@ -241,7 +2845,239 @@ class WeatherModel:
                     ])
                 }
             ],
-            "name": location
+            "name": location,
+            "simulated": True
+        }
+
+
+class RateLimiter:
+    """Kubelek zetonow: srednio rate zdarzen na sekunde, najwyzej burst naraz"""
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self):
+        """Zajmuje zeton i zwraca, ile sekund trzeba poczekac, zanim mozna go uzyc"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return max(0.0, -self.tokens / self.rate)
+
+
+# zmiana uznawana za "duza" dla kazdej metryki - od niej zalezy, jak czesto odswiezac
+WEATHER_CHANGE_SCALES = {"temp": 1.0, "humidity": 5.0, "pressure": 2.0, "wind": 2.0}
+
+
+class WeatherPoller:
+    """Odswieza przypiete miejsca w tle, bez klikania "Fetch Weather".
+
+    Kolejka priorytetowa (heapq) terminow odswiezenia obslugiwana przez jeden watek.
+    Odstep dla miejsca rosnie, gdy pogoda sie nie zmienia, i maleje przy szybkich
+    zmianach (w granicach min_interval..max_interval). Wszystkie zapytania dzieli
+    wspolny limit rate_per_minute, a terminy sa rozrzucone losowo o +-jitter.
+    Wyniki (miejsce, dane, blad) trafiaja do kolejki updates.
+    """
+
+    def __init__(self, weather_model, min_interval=WEATHER_POLL_MIN_INTERVAL, max_interval=WEATHER_POLL_MAX_INTERVAL,
+                 rate_per_minute=WEATHER_POLL_RATE, jitter=0.1, max_workers=4):
+        self.weather_model = weather_model
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.jitter = jitter
+        self.rate_limiter = RateLimiter(rate_per_minute / 60.0)
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers,
+                                                              thread_name_prefix="scihlp-poll")
+        self.updates = queue.Queue()
+
+        self.condition = threading.Condition()
+        self.heap = []  # (termin, numer, klucz, pokolenie)
+        self.sequence = 0
+        # klucz -> pokolenie; pin/unpin je zmienia, wpisy i odpowiedzi starszych pokolen sa pomijane
+        self.generations = {}
+        self.locations = {}  # klucz -> nazwa miejsca
+        self.intervals = {}
+        self.running = False
+        self.thread = None
+        self.polls = 0
+        self.pending = set()  # zlecone poll(), odwolywane w stop()
+
+        store = weather_model.store
+        if store is not None:
+            for key, location in store.load_pinned():
+                self.locations[key] = location
+                self.intervals[key] = min_interval
+
+    def jittered(self, interval):
+
+        return interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def schedule(self, key, delay, generation=None):
+
+        with self.condition:
+            if generation is None:
+                generation = self.generations.get(key, 0)
+            elif generation != self.generations.get(key, 0):
+                return  # miejsce odpiete albo przypiete od nowa - ten lancuch odswiezen sie konczy
+            self.sequence += 1
+            heapq.heappush(self.heap, (time.monotonic() + delay, self.sequence, key, generation))
+            self.condition.notify()
+
+    def next_generation(self, key):
+
+        with self.condition:
+            self.generations[key] = self.generations.get(key, 0) + 1
+            return self.generations[key]
+
+    def first_delay(self, key):
+        """Zapamietane swieze dane moga poczekac, reszta rusza zaraz (rozlozona w czasie)"""
+        cached = self.weather_model.get_cached_weather(self.locations[key])
+        if cached is not None:
+            return max(0.0, cached["fetched_at"] + self.intervals[key] - time.time()) + self.jittered(1.0)
+        return random.uniform(0, self.min_interval * self.jitter)
+
+    def start(self):
+
+        if self.running:
+            return
+        self.running = True
+        for key in list(self.locations):
+            self.schedule(key, self.first_delay(key))
+        self.thread = threading.Thread(target=self.run, name="scihlp-poller", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+            pending, self.pending = self.pending, set()
+        for future in pending:
+            future.cancel()
+        self.executor.shutdown(wait=False)
+
+    def pin(self, location):
+
+        key = self.weather_model.location_key(location)
+        if not key or key in self.locations:
+            return False
+        self.locations[key] = location.strip()
+        self.intervals[key] = self.min_interval
+        generation = self.next_generation(key)
+        if self.weather_model.store is not None:
+            self.weather_model.store.set_pinned(key, location.strip(), True)
+        if self.running:
+            self.schedule(key, self.first_delay(key), generation)
+        return True
+
+    def unpin(self, location):
+
+        key = self.weather_model.location_key(location)
+        if key not in self.locations:
+            return False
+        # wpis w kolejce zostaje, ale run() pominie go po zmianie pokolenia
+        self.next_generation(key)
+        del self.locations[key]
+        self.intervals.pop(key, None)
+        if self.weather_model.store is not None:
+            self.weather_model.store.set_pinned(key, location.strip(), False)
+        return True
+
+    def pinned(self):
+
+        return list(self.locations.values())
+
+    def run(self):
+
+        while True:
+            with self.condition:
+                while self.running and (not self.heap or self.heap[0][0] > time.monotonic()):
+                    timeout = self.heap[0][0] - time.monotonic() if self.heap else None
+                    self.condition.wait(timeout)
+                if not self.running:
+                    return
+                _, _, key, generation = heapq.heappop(self.heap)
+                if generation != self.generations.get(key, 0) or key not in self.locations:
+                    continue
+
+            if self.weather_model.offline:
+                self.schedule(key, self.jittered(self.intervals[key]), generation)
+                continue
+
+            # wspolny limit zapytan; czekajac nie trzymamy blokady kolejki
+            wait = self.rate_limiter.reserve()
+            if wait:
+                with self.condition:
+                    self.condition.wait_for(lambda: not self.running, wait)
+                    if not self.running:
+                        return
+            try:
+                future = self.executor.submit(self.poll, key, generation)
+            except RuntimeError:
+                return  # executor zamkniety w stop()
+            with self.condition:
+                if not self.running:
+                    future.cancel()  # stop() juz odwolal pozostale
+                    return
+                self.pending.add(future)
+            future.add_done_callback(self.forget_poll)
+
+    def forget_poll(self, future):
+
+        with self.condition:
+            self.pending.discard(future)
+
+    def poll(self, key, generation=None):
+
+        location = self.locations.get(key)
+        if location is None:
+            return
+        previous = self.weather_model.get_cached_weather(location)
+        try:
+            data = self.weather_model.get_weather_with_retry(location, retries=1, max_age=0)
+            error = None
+        except Exception as e:
+            data, error = None, str(e)
+        with self.condition:
+            self.polls += 1
+
+        if key not in self.intervals:
+            return
+        self.intervals[key] = self.adapt_interval(self.intervals[key], previous, data)
+        self.schedule(key, self.jittered(self.intervals[key]), generation)
+        self.updates.put((location, data, error))
+
+    def adapt_interval(self, interval, previous, data):
+
+        if data is None or previous is None or data is previous:
+            return interval
+        change = 0.0
+        for metric, (group, field) in WEATHER_METRICS.items():
+            old = previous.get(group, {}).get(field)
+            new = data.get(group, {}).get(field)
+            if old is not None and new is not None:
+                change = max(change, abs(new - old) / WEATHER_CHANGE_SCALES[metric])
+
+        # odstep dazy do takiego, w ktorym zmiana miedzy odswiezeniami jest umiarkowana
+        if change >= 1:
+            interval /= 2
+        elif change < 0.25:
+            interval *= 1.5
+        return min(max(interval, self.min_interval), self.max_interval)
+
+    def stats(self):
+
+        return {
+            "pinned": len(self.locations),
+            "scheduled": sum(1 for _, _, key, generation in list(self.heap)
+                             if generation == self.generations.get(key, 0) and key in self.locations),
+            "polls": self.polls,
+            "intervals": dict(self.intervals),
         }
 
 
@@ -390,6 +3226,41 @@ class AuthView:
             self.controller.show_login_form()
 
 
+def decimate_minmax(x, y, columns):
+    """Zostawia tylko min i max z kazdej kolumny pikseli (x musi byc posortowane).
+
+    y moze byc tablica 2-D: jeden wiersz na krzywa, wspolne x.
+    """
+    columns = max(int(columns), 1)
+    if len(x) <= 2 * columns:
+        return x, y
+
+    edges = np.linspace(x[0], x[-1], columns + 1)
+    starts = np.unique(np.searchsorted(x, edges[:-1]))
+    ends = np.r_[starts[1:], len(x)]
+
+    low = np.fmin.reduceat(y, starts, axis=-1)
+    high = np.fmax.reduceat(y, starts, axis=-1)
+    has_gap = np.add.reduceat(np.isnan(y), starts, axis=-1) > 0
+    # kolejnosc min/max zgodna z kierunkiem funkcji w kolumnie
+    rising = y[..., starts] <= y[..., ends - 1]
+    second = np.where(rising, high, low)
+
+    xs = np.column_stack([x[starts], x[ends - 1], x[ends - 1]]).ravel()
+    # trzeci punkt kolumny: NaN (przerwa w linii) albo powtorzenie drugiego
+    ys = np.stack([
+        np.where(rising, low, high),
+        second,
+        np.where(has_gap, np.nan, second)
+    ], axis=-1).reshape(*y.shape[:-1], -1)
+
+    if y.ndim == 1:
+        keep = np.ones((len(starts), 3), dtype=bool)
+        keep[:, 2] = has_gap
+        return xs[keep.ravel()], ys[keep.ravel()]
+    return xs, ys
+
+
 class PlotView:
     """odpowiedzialny za interfejs rysowania wykresów"""
 
@@ -397,8 +3268,17 @@ class PlotView:
         self.parent = parent
         self.controller = None
         self.function_entry = None
+        self.sweep_entry = None
+        self.backend_combo = None
         self.plot_frame = None
         self.canvas = None
+        self.toolbar = None
+        self.axes = None
+        self.line = None
+        self.curves = None
+        self.background = None
+        self.setting_limits = False
+        self.viewport_job = None
         self.setup_ui()
 
     def set_controller(self, controller):
@@ -418,9 +3298,23 @@ class PlotView:
         self.function_entry = tk.Entry(input_frame, width=30)
         self.function_entry.pack(side=tk.LEFT, padx=5)
 
+        # kilka funkcji oddzielonych ";" i/lub przebieg parametru, np. sin(a*x) z a=1:50
+        tk.Label(input_frame, text="Sweep (e.g., a=1:50):").pack(side=tk.LEFT, padx=5)
+        self.sweep_entry = tk.Entry(input_frame, width=12)
+        self.sweep_entry.pack(side=tk.LEFT, padx=5)
+
         plot_button = tk.Button(input_frame, text="Plot", command=self.handle_plot_click)
         plot_button.pack(side=tk.LEFT, padx=5)
 
+        analyze_button = tk.Button(input_frame, text="Analyze", command=self.handle_analyze_click)
+        analyze_button.pack(side=tk.LEFT, padx=5)
+
+        tk.Label(input_frame, text="Backend:").pack(side=tk.LEFT, padx=5)
+        self.backend_combo = ttk.Combobox(input_frame, values=available_backends(), state="readonly", width=9)
+        self.backend_combo.set(EVALUATION_BACKEND)
+        self.backend_combo.pack(side=tk.LEFT, padx=5)
+        self.backend_combo.bind("<<ComboboxSelected>>", self.handle_backend_selected)
+
 
         self.plot_frame = tk.Frame(frame)
         self.plot_frame.pack(fill=tk.BOTH, expand=True, pady=10)
@@ -429,29 +3323,190 @@ class PlotView:
 
         return self.function_entry.get()
 
-    def display_plot(self, x_data, y_data, title):
+    def get_sweep_input(self):
 
-        for widget in self.plot_frame.winfo_children():
-            widget.destroy()
+        return self.sweep_entry.get()
 
+    def build_canvas(self):
+        """Tworzy figure, osie i linie raz; kolejne wykresy tylko podmieniaja dane"""
         figure = Figure(figsize=(6, 4), dpi=100)
-        ax = figure.add_subplot(111)
+        self.axes = figure.add_subplot(111)
+        self.axes.set_xlabel("x")
+        self.axes.set_ylabel("y")
+        self.axes.grid(True)
 
-        ax.plot(x_data, y_data)
-        ax.set_title(title)
-        ax.set_xlabel("x")
-        ax.set_ylabel("y")
-        ax.grid(True)
+        # linia rysowana osobno (blitting), tlo osi jest zapamietywane po kazdym pelnym rysowaniu
+        self.line, = self.axes.plot([], [], animated=True)
+        # wiele krzywych jako jedna kolekcja zamiast osobnych ax.plot
+        self.curves = LineCollection([], animated=True)
+        self.axes.add_collection(self.curves)
 
         self.canvas = FigureCanvasTkAgg(figure, self.plot_frame)
-        self.canvas.draw()
+        self.toolbar = NavigationToolbar2Tk(self.canvas, self.plot_frame, pack_toolbar=False)
+        self.toolbar.pack(side=tk.BOTTOM, fill=tk.X)
         self.canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
 
+        self.canvas.mpl_connect("draw_event", self.handle_draw)
+        # przy przesuwaniu/zoomie dane sa dogrywane dla nowego zakresu
+        self.axes.callbacks.connect("xlim_changed", self.handle_xlim_changed)
+
+    def display_plot(self, x_data, y_data, title):
+
+        if self.canvas is None:
+            self.build_canvas()
+        if self.viewport_job is not None:
+            self.parent.after_cancel(self.viewport_job)
+            self.viewport_job = None
+
+        self.line.set_data(*self.prepare_line_data(x_data, y_data))
+        self.curves.set_segments([])
+        self.set_legend(None, None)
+        self.axes.set_title(title)
+
+        self.setting_limits = True
+        self.axes.set_xlim(x_data[0], x_data[-1])
+        self.setting_limits = False
+        self.axes.relim()
+        self.axes.autoscale(axis="y")
+
+        # nowy wykres = nowy punkt "Home" w toolbarze
+        self.toolbar.update()
+        self.canvas.draw()
+
+    def display_curves(self, x_data, ys_data, labels, title):
+        """Rysuje wiele krzywych (wiersze ys_data) jako jedna LineCollection"""
+        if self.canvas is None:
+            self.build_canvas()
+        if self.viewport_job is not None:
+            self.parent.after_cancel(self.viewport_job)
+            self.viewport_job = None
+
+        self.line.set_data([], [])
+        segments = self.prepare_curve_segments(x_data, ys_data)
+        self.curves.set_segments(segments)
+
+        colormap = matplotlib.colormaps["tab10" if len(ys_data) <= 10 else "viridis"]
+        colors = colormap(np.arange(len(ys_data)) if len(ys_data) <= 10 else np.linspace(0, 1, len(ys_data)))
+        self.curves.set_color(colors)
+        self.set_legend(colors, labels)
+        self.axes.set_title(title)
+
+        self.setting_limits = True
+        self.axes.set_xlim(x_data[0], x_data[-1])
+        self.setting_limits = False
+        # relim nie uwzglednia kolekcji, zakres y liczymy sami
+        finite = segments[..., 1][np.isfinite(segments[..., 1])]
+        if len(finite):
+            low, high = finite.min(), finite.max()
+            margin = 0.05 * (high - low) or 1.0
+            self.axes.set_ylim(low - margin, high + margin)
+
+        self.toolbar.update()
+        self.canvas.draw()
+
+    def set_legend(self, colors, labels):
+
+        legend = self.axes.get_legend()
+        if legend is not None:
+            legend.remove()
+        if labels and len(labels) <= 10:
+            handles = [Line2D([], [], color=color) for color in colors]
+            self.axes.legend(handles, labels, fontsize="small")
+
+    def prepare_curve_segments(self, x_data, ys_data):
+
+        x, ys = decimate_minmax(x_data, ys_data, self.get_plot_width())
+        ys = np.where(np.isfinite(ys), ys, np.nan)
+        return np.stack([np.broadcast_to(x, ys.shape), ys], axis=-1)
+
+    def get_plot_width(self):
+        """Szerokosc osi w pikselach"""
+        if self.axes is None:
+            return 600
+        return self.axes.bbox.width
+
+    def prepare_line_data(self, x_data, y_data):
+
+        x, y = decimate_minmax(x_data, y_data, self.get_plot_width())
+        # inf psuje autoskalowanie osi, rysujemy go jako przerwe
+        return x, np.where(np.isfinite(y), y, np.nan)
+
+    def update_plot_data(self, x_data, y_data):
+        """Podmienia dane linii bez przerysowania osi (zakres osi sie nie zmienia)"""
+        self.line.set_data(*self.prepare_line_data(x_data, y_data))
+
+        if self.background is None:
+            self.canvas.draw_idle()
+            return
+
+        self.blit_data()
+
+    def update_curves_data(self, x_data, ys_data):
+
+        self.curves.set_segments(self.prepare_curve_segments(x_data, ys_data))
+
+        if self.background is None:
+            self.canvas.draw_idle()
+            return
+
+        self.blit_data()
+
+    def blit_data(self):
+
+        self.canvas.restore_region(self.background)
+        self.axes.draw_artist(self.curves)
+        self.axes.draw_artist(self.line)
+        self.canvas.blit(self.axes.bbox)
+
+    def handle_draw(self, event):
+
+        self.background = self.canvas.copy_from_bbox(self.axes.bbox)
+        self.axes.draw_artist(self.curves)
+        self.axes.draw_artist(self.line)
+
+    def get_viewport(self):
+
+        return self.axes.get_xlim()
+
     def handle_plot_click(self):
 
         if self.controller:
             self.controller.create_plot()
 
+    def handle_analyze_click(self):
+
+        if self.controller:
+            self.controller.analyze_function()
+
+    def handle_backend_selected(self, event=None):
+
+        if self.controller:
+            self.controller.change_backend(self.backend_combo.get())
+
+    def set_backend(self, backend):
+
+        self.backend_combo.set(backend)
+
+    def show_analysis(self, title, text):
+
+        messagebox.showinfo(title, text)
+
+    def handle_xlim_changed(self, ax):
+
+        if self.setting_limits:
+            return
+
+        # pan wysyla wiele zdarzen, dane dogrywamy dopiero po chwili spokoju
+        if self.viewport_job is not None:
+            self.parent.after_cancel(self.viewport_job)
+        self.viewport_job = self.parent.after(50, self.handle_viewport_changed)
+
+    def handle_viewport_changed(self):
+
+        self.viewport_job = None
+        if self.controller:
+            self.controller.update_viewport(*self.get_viewport())
+
 
 class WeatherView:
 
@@ -461,6 +3516,13 @@ class WeatherView:
         self.controller = None
         self.location_entry = None
         self.weather_data_frame = None
+        self.weather_table = None
+        self.progress_label = None
+        self.offline_var = None
+        self.metric_combo = None
+        self.expected_rows = 0
+        self.received_rows = 0
+        self.failed_rows = 0
         self.setup_ui()
 
     def set_controller(self, controller):
@@ -476,6 +3538,7 @@ class WeatherView:
         input_frame = tk.Frame(frame)
         input_frame.pack(fill=tk.X, pady=10)
 
+        # kilka miejsc oddzielonych ";" albo lista z pliku (jedno miejsce w linii)
         tk.Label(input_frame, text="Enter location:").pack(side=tk.LEFT, padx=5)
         self.location_entry = tk.Entry(input_frame, width=30)
         self.location_entry.pack(side=tk.LEFT, padx=5)
@@ -483,6 +3546,35 @@ class WeatherView:
         fetch_button = tk.Button(input_frame, text="Fetch Weather", command=self.handle_fetch_click)
         fetch_button.pack(side=tk.LEFT, padx=5)
 
+        load_button = tk.Button(input_frame, text="Load List...", command=self.handle_load_click)
+        load_button.pack(side=tk.LEFT, padx=5)
+
+        # offline: tylko zapamietane dane, bez zapytan do API
+        self.offline_var = tk.BooleanVar(value=False)
+        offline_check = tk.Checkbutton(input_frame, text="Offline", variable=self.offline_var,
+                                       command=self.handle_offline_toggle)
+        offline_check.pack(side=tk.LEFT, padx=5)
+
+        self.metric_combo = ttk.Combobox(input_frame, values=list(WEATHER_METRICS), state="readonly", width=9)
+        self.metric_combo.set("temp")
+        self.metric_combo.pack(side=tk.LEFT, padx=5)
+
+        history_button = tk.Button(input_frame, text="History", command=self.handle_history_click)
+        history_button.pack(side=tk.LEFT, padx=5)
+
+        # przypiete miejsca sa odswiezane w tle
+        pin_frame = tk.Frame(frame)
+        pin_frame.pack(fill=tk.X)
+
+        pin_button = tk.Button(pin_frame, text="Pin", command=self.handle_pin_click)
+        pin_button.pack(side=tk.LEFT, padx=5)
+
+        unpin_button = tk.Button(pin_frame, text="Unpin", command=self.handle_unpin_click)
+        unpin_button.pack(side=tk.LEFT, padx=5)
+
+        pinned_button = tk.Button(pin_frame, text="Show Pinned", command=self.handle_show_pinned_click)
+        pinned_button.pack(side=tk.LEFT, padx=5)
+
 
         self.weather_data_frame = tk.Frame(frame)
         self.weather_data_frame.pack(fill=tk.BOTH, expand=True, pady=10)
@@ -498,6 +3590,7 @@ class WeatherView:
     def display_weather_data(self, weather_data):
         for widget in self.weather_data_frame.winfo_children():
             widget.destroy()
+        self.weather_table = None
 
         weather_frame = tk.Frame(self.weather_data_frame)
         weather_frame.pack(fill=tk.BOTH, expand=True, pady=10)
@@ -526,23 +3619,289 @@ class WeatherView:
                                   font=("Arial", 12))
         pressure_label.pack(pady=5)
 
-        time_label = tk.Label(weather_frame, text=f"Last Updated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
-                              font=("Arial", 10))
+        updated = datetime.fromtimestamp(weather_data.get("fetched_at", time.time())).strftime('%Y-%m-%d %H:%M:%S')
+        if weather_data.get("simulated"):
+            updated += " (simulated data, no API key)"
+        time_label = tk.Label(weather_frame, text=f"Last Updated: {updated}", font=("Arial", 10))
         time_label.pack(pady=5)
 
+    def start_weather_table(self, count):
+        """Pusta tabela na wyniki wielu miejsc, wypelniana w miare naplywania odpowiedzi"""
+        for widget in self.weather_data_frame.winfo_children():
+            widget.destroy()
+
+        self.expected_rows = count
+        self.received_rows = 0
+        self.failed_rows = 0
+        self.progress_label = tk.Label(self.weather_data_frame, font=("Arial", 10))
+        self.progress_label.pack(anchor="w")
+        self.update_progress()
+
+        table_frame = tk.Frame(self.weather_data_frame)
+        table_frame.pack(fill=tk.BOTH, expand=True, pady=5)
+
+        columns = ("location", "temp", "description", "humidity", "wind", "pressure", "updated")
+        self.weather_table = ttk.Treeview(table_frame, columns=columns, show="headings")
+        headings = ("Location", "Temp (°C)", "Description", "Humidity (%)", "Wind (m/s)", "Pressure (hPa)",
+                    "Updated")
+        for column, heading in zip(columns, headings):
+            self.weather_table.heading(column, text=heading)
+            self.weather_table.column(column, width=120 if column in ("location", "description") else 90)
+
+        scrollbar = ttk.Scrollbar(table_frame, orient=tk.VERTICAL, command=self.weather_table.yview)
+        self.weather_table.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.weather_table.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+    def add_weather_row(self, location, weather_data, error=None):
+        """Dodaje wiersz miejsca albo podmienia juz pokazany (np. stare dane na odswiezone)"""
+        if weather_data is None:
+            values = (location, "", f"Error: {error}", "", "", "", "")
+        else:
+            updated = datetime.fromtimestamp(weather_data.get("fetched_at", time.time())).strftime("%Y-%m-%d %H:%M")
+            if weather_data.get("simulated"):
+                updated += " (simulated)"
+            values = (
+                weather_data["name"],
+                weather_data["main"]["temp"],
+                weather_data["weather"][0]["description"],
+                weather_data["main"]["humidity"],
+                weather_data["wind"]["speed"],
+                weather_data["main"]["pressure"],
+                updated
+            )
+
+        row = " ".join(location.split()).lower()
+        if self.weather_table.exists(row):
+            # stary wiersz mogl byc bledem, liczymy od nowa
+            if self.weather_table.set(row, "description").startswith("Error: "):
+                self.failed_rows -= 1
+            self.weather_table.item(row, values=values)
+        else:
+            self.received_rows += 1
+            self.weather_table.insert("", tk.END, iid=row, values=values)
+        if weather_data is None:
+            self.failed_rows += 1
+        self.update_progress()
+
+    def update_weather_row(self, location, weather_data):
+        """Odswieza wiersz miejsca, jesli jest w pokazanej tabeli"""
+        row = " ".join(location.split()).lower()
+        if self.weather_table is not None and self.weather_table.exists(row):
+            self.add_weather_row(location, weather_data)
+
+    def finish_weather_table(self):
+
+        self.update_progress(done=True)
+
+    def update_progress(self, done=False):
+
+        text = f"{self.received_rows}/{self.expected_rows} locations"
+        if self.failed_rows:
+            text += f", {self.failed_rows} failed"
+        if done:
+            text += f" - Last Updated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
+        self.progress_label.config(text=text)
+
     def handle_fetch_click(self):
 
         if self.controller:
             self.controller.fetch_weather_data()
 
+    def get_history_metric(self):
+
+        return self.metric_combo.get()
+
+    def set_offline(self, offline):
+
+        self.offline_var.set(offline)
+
+    def handle_offline_toggle(self):
+
+        if self.controller:
+            self.controller.set_offline(self.offline_var.get())
+
+    def handle_history_click(self):
+
+        if self.controller:
+            self.controller.show_weather_history()
+
+    def handle_pin_click(self):
+
+        if self.controller:
+            self.controller.pin_locations()
+
+    def handle_unpin_click(self):
+
+        if self.controller:
+            self.controller.unpin_locations()
+
+    def handle_show_pinned_click(self):
+
+        if self.controller:
+            self.controller.show_pinned()
+
+    def handle_load_click(self):
+
+        path = filedialog.askopenfilename(filetypes=[("Text files", "*.txt"), ("All files", "*.*")])
+        if path and self.controller:
+            self.controller.load_locations(path)
+
+
+class VirtualListbox:
+    """Listbox dla dlugich list: do Tk trafiaja tylko widoczne wiersze, reszta jest w self.items"""
+
+    def __init__(self, parent, height=15, width=50, format_item=str, selectmode=tk.BROWSE, on_scroll_end=None):
+        self.format_item = format_item
+        self.on_scroll_end = on_scroll_end  # wolane, gdy przewijanie dojdzie do konca (doczytanie)
+        self.items = []
+        self.first = 0  # pozycja w self.items pierwszego widocznego wiersza
+        self.visible_rows = height
+        self.rows = []  # teksty wierszy wstawionych teraz do Listboxa
+        self.selected = set()  # pozycje w self.items, takze poza widocznym fragmentem
+
+        self.frame = tk.Frame(parent)
+        self.listbox = tk.Listbox(self.frame, height=height, width=width, selectmode=selectmode,
+                                  exportselection=False, activestyle=tk.NONE)
+        self.listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        # pasek przewijania opisuje cala liste, nie wiersze w Listboxie
+        self.scrollbar = tk.Scrollbar(self.frame, command=self.handle_scrollbar)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+        self.listbox.bind("<<ListboxSelect>>", self.handle_select)
+        self.listbox.bind("<Configure>", self.handle_resize)
+        self.listbox.bind("<MouseWheel>", lambda event: self.scroll_by(-3 if event.delta > 0 else 3))
+        self.listbox.bind("<Button-4>", lambda event: self.scroll_by(-3))
+        self.listbox.bind("<Button-5>", lambda event: self.scroll_by(3))
+        self.listbox.bind("<Up>", lambda event: self.move_selection(-1))
+        self.listbox.bind("<Down>", lambda event: self.move_selection(1))
+        if selectmode in (tk.MULTIPLE, tk.EXTENDED):
+            self.listbox.bind("<Control-a>", lambda event: self.select_all())
+
+    def pack(self, **kwargs):
+
+        self.frame.pack(**kwargs)
+
+    def set_items(self, items, keep_selection=False):
+        """Podmienia liste; w Listboxie zmieniaja sie tylko wiersze, ktore wygladaja inaczej"""
+        self.items = items
+        if keep_selection:
+            self.selected = {position for position in self.selected if position < len(items)}
+        else:
+            self.selected = set()
+        self.render()
+
+    def get_selection(self):
+
+        return sorted(self.selected)
+
+    def select_all(self):
+
+        self.selected = set(range(len(self.items)))
+        self.render()
+        return "break"
+
+    def render(self):
+
+        self.first = max(0, min(self.first, len(self.items) - self.visible_rows))
+        # jeden wiersz wiecej na czesciowo widoczny dol listy
+        rows = [self.format_item(item) for item in self.items[self.first:self.first + self.visible_rows + 1]]
+
+        for row, (old, new) in enumerate(zip(self.rows, rows)):
+            if old != new:
+                self.listbox.delete(row)
+                self.listbox.insert(row, new)
+        if len(self.rows) > len(rows):
+            self.listbox.delete(len(rows), tk.END)
+        elif len(rows) > len(self.rows):
+            self.listbox.insert(tk.END, *rows[len(self.rows):])
+        self.rows = rows
+
+        self.listbox.selection_clear(0, tk.END)
+        for row in range(len(rows)):
+            if self.first + row in self.selected:
+                self.listbox.selection_set(row)
+
+        if self.items:
+            self.scrollbar.set(self.first / len(self.items),
+                               min(1.0, (self.first + self.visible_rows) / len(self.items)))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+    def scroll_to(self, first):
+
+        first = max(0, min(first, len(self.items) - self.visible_rows))
+        if first != self.first:
+            self.first = first
+            self.render()
+        if self.on_scroll_end is not None and first + 2 * self.visible_rows >= len(self.items):
+            self.on_scroll_end()
+
+    def scroll_by(self, rows):
+
+        self.scroll_to(self.first + rows)
+        return "break"
+
+    def see(self, position):
+
+        if position < self.first:
+            self.scroll_to(position)
+        elif position >= self.first + self.visible_rows:
+            self.scroll_to(position - self.visible_rows + 1)
+
+    def handle_scrollbar(self, action, amount, unit=None):
+
+        if action == "moveto":
+            self.scroll_to(int(float(amount) * len(self.items)))
+        elif action == "scroll":
+            step = self.visible_rows if unit == "pages" else 1
+            self.scroll_by(int(amount) * step)
+
+    def handle_select(self, event):
+
+        if self.listbox.cget("selectmode") in (tk.BROWSE, tk.SINGLE):
+            self.selected.clear()
+        else:
+            self.selected.difference_update(range(self.first, self.first + len(self.rows)))
+        self.selected.update(self.first + row for row in self.listbox.curselection())
+
+    def handle_resize(self, event):
+
+        box = self.listbox.bbox(0)
+        if box is None:
+            return
+        visible_rows = max(1, event.height // box[3])
+        if visible_rows != self.visible_rows:
+            self.visible_rows = visible_rows
+            self.render()
+
+    def move_selection(self, step):
+
+        if not self.items:
+            return "break"
+        if self.selected:
+            current = max(self.selected) if step > 0 else min(self.selected)
+            position = max(0, min(current + step, len(self.items) - 1))
+        else:
+            position = self.first
+        self.selected = {position}
+        self.see(position)
+        self.render()
+        return "break"
+
 
 class TaskView:
 
+    STATUS_FILTERS = {"All": None, "Pending": TASK_PENDING, "Done": TASK_DONE}
 
     def __init__(self, parent):
         self.parent = parent
         self.controller = None
         self.task_entry = None
+        self.status_combo = None
+        self.tag_entry = None
+        self.search_entry = None
         self.tasks_listbox = None
         self.setup_ui()
 
@@ -566,19 +3925,37 @@ class TaskView:
         add_button = tk.Button(input_frame, text="Add Task", command=self.handle_add_click)
         add_button.pack(side=tk.LEFT, padx=5)
 
+        tk.Label(frame, text="Use #tag, !priority (0-9) and due:YYYY-MM-DD in the task text. "
+                              "Search: words are ANDed, OR between groups, word* for prefixes, is:done, #tag",
+                 fg="gray").pack(anchor=tk.W)
 
-        tasks_frame = tk.Frame(frame)
-        tasks_frame.pack(fill=tk.BOTH, expand=True, pady=10)
+        filter_frame = tk.Frame(frame)
+        filter_frame.pack(fill=tk.X, pady=5)
 
-        # todolista paskiem przewijania
-        self.tasks_listbox = tk.Listbox(tasks_frame, height=15, width=50)
-        self.tasks_listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        tk.Label(filter_frame, text="Show:").pack(side=tk.LEFT, padx=5)
+        self.status_combo = ttk.Combobox(filter_frame, values=list(self.STATUS_FILTERS), state="readonly", width=10)
+        self.status_combo.set("All")
+        self.status_combo.pack(side=tk.LEFT, padx=5)
+        self.status_combo.bind("<<ComboboxSelected>>", lambda event: self.handle_filter_click())
 
-        scrollbar = tk.Scrollbar(tasks_frame)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        tk.Label(filter_frame, text="Tag:").pack(side=tk.LEFT, padx=5)
+        self.tag_entry = tk.Entry(filter_frame, width=15)
+        self.tag_entry.pack(side=tk.LEFT, padx=5)
+        self.tag_entry.bind("<Return>", lambda event: self.handle_filter_click())
+
+        tk.Label(filter_frame, text="Search:").pack(side=tk.LEFT, padx=5)
+        self.search_entry = tk.Entry(filter_frame, width=25)
+        self.search_entry.pack(side=tk.LEFT, padx=5)
+        self.search_entry.bind("<Return>", lambda event: self.handle_filter_click())
+
+        filter_button = tk.Button(filter_frame, text="Filter", command=self.handle_filter_click)
+        filter_button.pack(side=tk.LEFT, padx=5)
 
-        self.tasks_listbox.config(yscrollcommand=scrollbar.set)
-        scrollbar.config(command=self.tasks_listbox.yview)
+
+        # todolista z paskiem przewijania, rysowane sa tylko widoczne zadania
+        self.tasks_listbox = VirtualListbox(frame, height=15, width=50, selectmode=tk.EXTENDED,
+                                            on_scroll_end=self.handle_scroll_end)
+        self.tasks_listbox.pack(fill=tk.BOTH, expand=True, pady=10)
 
 
         button_frame = tk.Frame(frame)
@@ -590,6 +3967,12 @@ class TaskView:
         remove_button = tk.Button(button_frame, text="Remove Task", command=self.handle_remove_click)
         remove_button.pack(side=tk.LEFT, padx=5)
 
+        select_all_button = tk.Button(button_frame, text="Select All", command=self.tasks_listbox.select_all)
+        select_all_button.pack(side=tk.LEFT, padx=5)
+
+        import_button = tk.Button(button_frame, text="Import...", command=self.handle_import_click)
+        import_button.pack(side=tk.LEFT, padx=5)
+
     def get_task_input(self):
 
         return self.task_entry.get()
@@ -598,22 +3981,33 @@ class TaskView:
 
         self.task_entry.delete(0, tk.END)
 
-    def get_selected_task_index(self):
+    def get_selected_task_indices(self):
 
-        selection = self.tasks_listbox.curselection()
-        return selection[0] if selection else None
+        return self.tasks_listbox.get_selection()
 
-    def update_tasks_display(self, tasks):
+    def get_filter(self):
+        """Zwraca (status, tag) wybrane nad lista; None = bez warunku"""
+        tag = self.tag_entry.get().strip().lstrip("#").lower()
+        return self.STATUS_FILTERS[self.status_combo.get()], tag or None
 
-        self.tasks_listbox.delete(0, tk.END)
-        for task in tasks:
-            self.tasks_listbox.insert(tk.END, task)
+    def get_search_query(self):
+
+        return self.search_entry.get().strip()
+
+    def update_tasks_display(self, tasks, keep_selection=False):
+
+        self.tasks_listbox.set_items(tasks, keep_selection)
 
     def handle_add_click(self):
 
         if self.controller:
             self.controller.add_task()
 
+    def handle_filter_click(self):
+
+        if self.controller:
+            self.controller.refresh_tasks_display()
+
     def handle_mark_done_click(self):
 
         if self.controller:
@@ -624,6 +4018,17 @@ class TaskView:
         if self.controller:
             self.controller.remove_task()
 
+    def handle_scroll_end(self):
+
+        if self.controller:
+            self.controller.load_more_tasks()
+
+    def handle_import_click(self):
+
+        path = filedialog.askopenfilename(filetypes=[("Task lists", "*.txt *.csv"), ("All files", "*.*")])
+        if path and self.controller:
+            self.controller.import_tasks(path)
+
 
 class ProfileView:
     """Widok odpowiedzialny za interfejs profilu użytkownika"""
@@ -769,6 +4174,10 @@ class MainView:
         logout_button = tk.Button(self.parent, text="Logout", command=self.handle_logout_click)
         logout_button.pack(pady=10)
 
+    def select_plot_tab(self):
+
+        self.notebook.select(0)
+
     def clear_parent(self):
 
         for widget in self.parent.winfo_children():
@@ -835,16 +4244,31 @@ class AuthController:
 
 class PlotController:
 
-    def __init__(self, plot_model, plot_view):
+    def __init__(self, plot_model, plot_view, runner=None):
         self.plot_model = plot_model
         self.plot_view = plot_view
+        # liczenie w tle, zeby petla Tk nie stala przy ciezkich wyrazeniach
+        self.runner = runner if runner is not None else BackgroundRunner(plot_view.parent)
+
+        self.current_function = None
+        self.current_batch = None
+        self.current_series = None
 
         self.plot_view.set_controller(self)
 
         # pokaz domyslny wykres
         self.show_default_plot()
 
+    def change_backend(self, backend):
+        success, message = self.plot_model.set_backend(backend)
+        if not success:
+            messagebox.showwarning("Backend", message)
+        self.plot_view.set_backend(self.plot_model.backend)
+
     def show_default_plot(self):
+        self.current_function = None
+        self.current_batch = None
+        self.current_series = None
         x, y = self.plot_model.get_default_data()
         self.plot_view.display_plot(x, y, "Default Plot: sin(x)")
 
@@ -855,24 +4279,225 @@ class PlotController:
             messagebox.showerror("Error", "Please enter a function")
             return
 
-        x, y, error = self.plot_model.generate_function_data(function_str)
+        expressions = [part.strip() for part in function_str.split(";") if part.strip()]
+        sweep_str = self.plot_view.get_sweep_input().strip()
+        if len(expressions) > 1 or sweep_str:
+            self.create_batch_plot(expressions, sweep_str)
+            return
+
+        # dogrywanie starego wykresu nie jest juz potrzebne
+        self.runner.cancel("viewport")
+        self.runner.submit(
+            "plot",
+            lambda result: self.show_function_result(function_str, *result),
+            self.show_plot_error,
+            self.plot_model.generate_function_data, function_str
+        )
 
+    def show_function_result(self, function_str, x, y, error):
         if error:
-            messagebox.showerror("Error", f"Error plotting function: {error}")
+            self.show_plot_error(error)
             return
 
+        self.current_function = function_str
+        self.current_batch = None
+        self.current_series = None
         title = f"Plot of {function_str}"
         self.plot_view.display_plot(x, y, title)
 
+    def create_batch_plot(self, expressions, sweep_str):
+        parameters = {}
+        if sweep_str:
+            try:
+                name, values = parse_parameter_sweep(sweep_str)
+            except ValueError as e:
+                messagebox.showerror("Error", str(e))
+                return
+            parameters[name] = values
+
+        self.runner.cancel("viewport")
+        self.runner.submit(
+            "plot",
+            lambda result: self.show_batch_result(expressions, parameters, sweep_str, *result),
+            self.show_plot_error,
+            self.plot_model.generate_batch_data, expressions, parameters
+        )
+
+    def show_batch_result(self, expressions, parameters, sweep_str, x, ys, labels, error):
+        if error:
+            self.show_plot_error(error)
+            return
+
+        self.current_function = None
+        self.current_batch = (expressions, parameters)
+        self.current_series = None
+        title = f"Plot of {'; '.join(expressions)}" + (f" for {sweep_str}" if sweep_str else "")
+        self.plot_view.display_curves(x, ys, labels, title)
+
+    def show_series(self, x, ys, labels, title):
+        """Rysuje gotowe dane (np. historie pogody); przy przyblizaniu sa tylko przycinane"""
+        self.runner.cancel("viewport")
+        self.current_function = None
+        self.current_batch = None
+        self.current_series = (x, ys)
+        self.plot_view.display_curves(x, ys, labels, title)
+
+    def show_plot_error(self, error):
+        messagebox.showerror("Error", f"Error plotting function: {error}")
+
+    def analyze_function(self):
+        function_str = self.plot_view.get_function_input().strip()
+
+        if not function_str:
+            messagebox.showerror("Error", "Please enter a function")
+            return
+        if ";" in function_str:
+            messagebox.showerror("Error", "Analysis works on a single function")
+            return
+
+        # analizujemy widoczny zakres osi x
+        x_min, x_max = self.plot_view.get_viewport()
+        self.runner.submit(
+            "analysis",
+            lambda result: self.show_analysis_result(function_str, *result),
+            lambda error: messagebox.showerror("Error", f"Error analyzing function: {error}"),
+            self.plot_model.analyze_function, function_str, x_min, x_max
+        )
+
+    def show_analysis_result(self, function_str, analysis, error):
+        if error:
+            messagebox.showerror("Error", f"Error analyzing function: {error}")
+            return
+
+        def format_points(xs, ys=None, limit=10):
+            if not len(xs):
+                return "none"
+            if ys is None:
+                items = [f"{x:.6g}" for x in xs[:limit]]
+            else:
+                items = [f"({x:.6g}, {y:.6g})" for x, y in zip(xs[:limit], ys[:limit])]
+            more = f" ... ({len(xs)} total)" if len(xs) > limit else ""
+            return ", ".join(items) + more
+
+        lines = [
+            f"Range: [{analysis['x_min']:.6g}, {analysis['x_max']:.6g}]",
+            f"Roots: {format_points(analysis['roots'])}",
+            f"Minima: {format_points(*analysis['minima'])}",
+            f"Maxima: {format_points(*analysis['maxima'])}",
+        ]
+        if analysis["integral"] is None:
+            lines.append(f"Integral: {analysis['integral_error']}")
+        else:
+            value, estimate = analysis["integral"]
+            lines.append(f"Integral: {value:.10g} (error estimate {estimate:.2g})")
+
+        self.plot_view.show_analysis(f"Analysis of {function_str}", "\n".join(lines))
+
+    def update_viewport(self, x_min, x_max):
+        if self.current_series is not None:
+            # dane sa juz policzone, wystarczy zdziesiatkowac widoczny fragment na nowo
+            x, ys = self.current_series
+            start, stop = np.searchsorted(x, [x_min, x_max])
+            start, stop = max(start - 1, 0), min(stop + 1, len(x))
+            if stop - start >= 2:
+                self.plot_view.update_curves_data(x[start:stop], ys[:, start:stop])
+        elif self.current_batch is not None:
+            expressions, parameters = self.current_batch
+            self.runner.submit(
+                "viewport",
+                lambda result: self.update_curves(*result),
+                lambda error: None,
+                self.plot_model.generate_batch_data, expressions, parameters, x_min=x_min, x_max=x_max
+            )
+        elif self.current_function is not None:
+            self.runner.submit(
+                "viewport",
+                lambda result: self.update_line(*result),
+                lambda error: None,
+                self.plot_model.generate_function_data, self.current_function, x_min=x_min, x_max=x_max
+            )
+        else:
+            self.runner.submit(
+                "viewport",
+                lambda result: self.update_line(*result, None),
+                lambda error: None,
+                self.plot_model.get_default_data, x_min, x_max
+            )
+
+    def update_line(self, x, y, error):
+        if not error:
+            self.plot_view.update_plot_data(x, y)
+
+    def update_curves(self, x, ys, labels, error):
+        if not error:
+            self.plot_view.update_curves_data(x, ys)
+
 
 class WeatherController:
 
-    def __init__(self, weather_model, weather_view):
+    def __init__(self, weather_model, weather_view, runner=None, poller=None):
         self.weather_model = weather_model
         self.weather_view = weather_view
+        # zapytanie HTTP nie moze blokowac petli Tk
+        self.runner = runner if runner is not None else BackgroundRunner(weather_view.parent)
+        self.poller = poller
+        self.updates_job = None
+        self.main_controller = None
 
 
         self.weather_view.set_controller(self)
+        self.weather_view.set_offline(self.weather_model.offline)
+
+        self.show_last_weather()
+        if self.poller is not None:
+            self.updates_job = self.runner.widget.after(1000, self.process_poller_updates)
+
+    def show_last_weather(self):
+        """Od razu ostatnie zapamietane dane, odswiezane w tle (stale-while-revalidate)"""
+        location, weather_data = self.weather_model.get_last_weather()
+        if weather_data is None:
+            return
+
+        self.weather_view.display_weather_data(weather_data)
+        if not self.weather_model.offline and not self.weather_model.is_fresh(weather_data):
+            # nieudane odswiezenie zostawia po prostu stare dane, bez komunikatu
+            self.runner.submit(
+                "weather",
+                self.weather_view.display_weather_data,
+                lambda message: None,
+                self.weather_model.get_weather_with_retry, location
+            )
+
+    def set_main_controller(self, main_controller):
+        self.main_controller = main_controller
+
+    def set_offline(self, offline):
+
+        self.weather_model.set_offline(offline)
+
+    def show_weather_history(self):
+        """Wykres historii wybranej metryki w zakladce wykresow"""
+        location = self.weather_view.get_location_input().strip()
+        metric = self.weather_view.get_history_metric()
+
+        if not location or ";" in location:
+            messagebox.showerror("Error", "Please enter a single location")
+            return
+
+        self.runner.submit(
+            "history",
+            lambda result: self.show_history_result(location, metric, *result),
+            self.show_weather_error,
+            self.weather_model.get_history_series, location, metric
+        )
+
+    def show_history_result(self, location, metric, x, ys, labels, error):
+
+        if error:
+            messagebox.showerror("Error", error)
+            return
+        if self.main_controller:
+            self.main_controller.show_series(x, ys, labels, f"{metric} history for {location} (hours from now)")
 
     def fetch_weather_data(self):
         """Pobiera dane pogodowe"""
@@ -882,19 +4507,121 @@ class WeatherController:
             messagebox.showerror("Error", "Please enter a location")
             return
 
-        weather_data = self.weather_model.fetch_weather_for_location(location)
+        # kilka miejsc oddzielonych ";" pobieramy naraz
+        locations = [part.strip() for part in location.split(";") if part.strip()]
+        if len(locations) > 1:
+            self.fetch_weather_batch(locations)
+            return
+
+        self.runner.submit(
+            "weather",
+            self.show_weather_data,
+            self.show_weather_error,
+            self.weather_model.fetch_weather_for_location, location
+        )
+
+    def show_weather_data(self, weather_data):
 
         if weather_data:
             self.weather_view.display_weather_data(weather_data)
         else:
             messagebox.showerror("Error", "Error fetching weather data")
 
+    def show_weather_error(self, message):
+
+        messagebox.showerror("Error", f"Error fetching weather data: {message}")
+
+    def load_locations(self, path):
+        """Pobiera pogode dla miejsc z pliku tekstowego (jedno w linii)"""
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                locations = [line.strip() for line in f if line.strip()]
+        except OSError as e:
+            messagebox.showerror("Error", f"Cannot read {path}: {e}")
+            return
+
+        if not locations:
+            messagebox.showerror("Error", "No locations in file")
+            return
+        self.fetch_weather_batch(locations)
+
+    def fetch_weather_batch(self, locations):
+
+        # tabela ma jeden wiersz na miejsce, powtorzenia z listy sa laczone
+        self.weather_view.start_weather_table(len({self.weather_model.location_key(location)
+                                                   for location in locations} - {""}))
+        self.runner.stream(
+            "weather",
+            self.show_batch_result,
+            self.finish_weather_batch,
+            self.show_weather_error,
+            self.weather_model.iter_weather_batch, locations
+        )
+
+    def show_batch_result(self, result):
+
+        location, weather_data, error = result
+        self.weather_view.add_weather_row(location, weather_data, error)
+
+    def finish_weather_batch(self):
+
+        self.weather_view.finish_weather_table()
+
+    def split_locations(self):
+
+        return [part.strip() for part in self.weather_view.get_location_input().split(";") if part.strip()]
+
+    def pin_locations(self):
+
+        locations = self.split_locations()
+        if not locations:
+            messagebox.showerror("Error", "Please enter a location")
+            return
+        if self.poller is None:
+            messagebox.showerror("Error", "Background refresh is not enabled")
+            return
+
+        added = [location for location in locations if self.poller.pin(location)]
+        messagebox.showinfo("Pinned", f"Pinned {len(added)} location(s), {len(self.poller.pinned())} in total")
+
+    def unpin_locations(self):
+
+        if self.poller is None:
+            return
+        removed = [location for location in self.split_locations() if self.poller.unpin(location)]
+        messagebox.showinfo("Pinned", f"Unpinned {len(removed)} location(s), {len(self.poller.pinned())} left")
+
+    def show_pinned(self):
+
+        if self.poller is None or not self.poller.pinned():
+            messagebox.showinfo("Pinned", "No pinned locations")
+            return
+        self.fetch_weather_batch(self.poller.pinned())
+
+    def process_poller_updates(self):
+        """Wyniki odswiezania w tle trafiaja do tabeli w watku Tk"""
+        while True:
+            try:
+                location, weather_data, error = self.poller.updates.get_nowait()
+            except queue.Empty:
+                break
+            if weather_data is not None:
+                self.weather_view.update_weather_row(location, weather_data)
+        self.updates_job = self.runner.widget.after(1000, self.process_poller_updates)
+
+    def close(self):
+
+        if self.updates_job is not None:
+            self.runner.widget.after_cancel(self.updates_job)
+            self.updates_job = None
+
 
 class TaskController:
 
     def __init__(self, task_model, task_view):
         self.task_model = task_model
         self.task_view = task_view
+        self.displayed_tasks = []  # wiersze listy -> rekordy zadan
 
 
         self.task_view.set_controller(self)
@@ -903,8 +4630,30 @@ class TaskController:
         self.refresh_tasks_display()
 
     def refresh_tasks_display(self):
-        tasks = self.task_model.get_all_tasks()
-        self.task_view.update_tasks_display(tasks)
+        status, tag = self.task_view.get_filter()
+        query = self.task_view.get_search_query()
+        if query:
+            self.displayed_tasks = self.task_model.search_tasks(query, status=status, tag=tag)
+        else:
+            # tyle, ile bylo juz przewiniete, reszta doczytuje sie przy przewijaniu
+            limit = max(len(self.displayed_tasks), TASK_PAGE_SIZE)
+            self.displayed_tasks = self.task_model.get_tasks(status=status, tag=tag, limit=limit)
+        self.task_view.update_tasks_display(self.displayed_tasks)
+
+    def load_more_tasks(self):
+        if self.task_view.get_search_query():
+            return
+
+        status, tag = self.task_view.get_filter()
+        page = self.task_model.get_tasks(status=status, tag=tag, offset=len(self.displayed_tasks),
+                                         limit=TASK_PAGE_SIZE)
+        if page:
+            self.displayed_tasks = self.displayed_tasks + page
+            self.task_view.update_tasks_display(self.displayed_tasks, keep_selection=True)
+
+    def get_selected_tasks(self):
+        return [self.displayed_tasks[index] for index in self.task_view.get_selected_task_indices()
+                if index < len(self.displayed_tasks)]
 
     def add_task(self):
         task = self.task_view.get_task_input()
@@ -913,33 +4662,58 @@ class TaskController:
             messagebox.showerror("Error", "Please enter a task")
             return
 
-        if self.task_model.add_new_task(task):
+        try:
+            text, priority, tags, due = parse_task_input(task)
+        except ValueError:
+            messagebox.showerror("Error", "Due date must be in YYYY-MM-DD format")
+            return
+
+        if self.task_model.add_new_task(text, priority=priority, tags=tags, due=due):
             self.task_view.clear_task_input()
             self.refresh_tasks_display()
         else:
             messagebox.showerror("Error", "Failed to add task")
 
+    def import_tasks(self, path):
+        try:
+            entries = read_task_file(path)
+        except (OSError, UnicodeDecodeError) as e:
+            messagebox.showerror("Error", f"Cannot read {path}: {e}")
+            return
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+            return
+
+        if not entries:
+            messagebox.showerror("Error", "No tasks in file")
+            return
+
+        tasks = self.task_model.add_new_tasks(entries)
+        self.refresh_tasks_display()
+        messagebox.showinfo("Import", f"Imported {len(tasks)} tasks")
+
     def mark_task_done(self):
-        index = self.task_view.get_selected_task_index()
+        tasks = self.get_selected_tasks()
 
-        if index is None:
+        if not tasks:
             messagebox.showerror("Error", "Please select a task")
             return
 
-        if self.task_model.mark_task_as_done(index):
+        if self.task_model.mark_tasks_as_done([task.id for task in tasks]):
             self.refresh_tasks_display()
         else:
             messagebox.showerror("Error", "Failed to mark task as done")
 
     def remove_task(self):
-        index = self.task_view.get_selected_task_index()
+        tasks = self.get_selected_tasks()
 
-        if index is None:
+        if not tasks:
             messagebox.showerror("Error", "Please select a task")
             return
 
-        if messagebox.askyesno("Confirm", "Are you sure you want to remove this task?"):
-            if self.task_model.remove_task_by_index(index):
+        question = "this task" if len(tasks) == 1 else f"these {len(tasks)} tasks"
+        if messagebox.askyesno("Confirm", f"Are you sure you want to remove {question}?"):
+            if self.task_model.remove_tasks([task.id for task in tasks]):
                 self.refresh_tasks_display()
             else:
                 messagebox.showerror("Error", "Failed to remove task")
@@ -1006,11 +4780,16 @@ class MainController:
         # Inicjalizacja modeli itp...
 
 
-        self.user_model = UserModel(DATA_FILE)
+        self.user_model = UserModel(DATA_FILE, create_storage(), save_delay=SAVE_DELAY)
         self.task_model = TaskModel(self.user_model)
-        self.weather_model = WeatherModel()
+        self.weather_model = WeatherModel(store=WeatherCacheStore(WEATHER_CACHE_FILE),
+                                          history=WeatherHistory(WEATHER_HISTORY_DIR))
         self.plot_model = PlotModel()
         self.notification_model = NotificationModel()
+        self.plot_runner = BackgroundRunner(self.root)
+        self.weather_runner = BackgroundRunner(self.root, max_workers=4)
+        self.weather_poller = WeatherPoller(self.weather_model)
+        self.weather_poller.start()
 
 
         self.auth_view = AuthView(self.root)
@@ -1036,17 +4815,37 @@ class MainController:
         self.main_view.setup_main_interface()
 
         # Inicjalizacja sub-kontrolerów
-        self.plot_controller = PlotController(self.plot_model, self.main_view.plot_view)
-        self.weather_controller = WeatherController(self.weather_model, self.main_view.weather_view)
+        self.plot_controller = PlotController(self.plot_model, self.main_view.plot_view, self.plot_runner)
+        self.weather_controller = WeatherController(self.weather_model, self.main_view.weather_view,
+                                                    self.weather_runner, self.weather_poller)
+        self.weather_controller.set_main_controller(self)
         self.task_controller = TaskController(self.task_model, self.main_view.task_view)
         self.profile_controller = ProfileController(self.user_model, self.notification_model,
                                                     self.main_view.profile_view)
 
+    def show_series(self, x, ys, labels, title):
+        """Pokazuje gotowe krzywe w zakladce wykresow"""
+        self.main_view.select_plot_tab()
+        self.plot_controller.show_series(x, ys, labels, title)
+
     def logout_user(self):
         """Wylogowuje użytkownika"""
+        # wyniki liczone dla zamykanego widoku wykresu nie sa juz potrzebne
+        self.plot_runner.cancel_all()
+        self.weather_runner.cancel_all()
+        if self.weather_controller is not None:
+            self.weather_controller.close()
         self.user_model.logout_user()
         self.auth_controller.show_login_form()
 
+    def shutdown(self):
+        """Zapisuje oczekujace zmiany przed zamknieciem aplikacji"""
+        self.plot_runner.shutdown()
+        self.weather_runner.shutdown()
+        self.weather_poller.stop()
+        self.weather_model.close()
+        self.user_model.close()
+
 
 
 class SciHlpApp:
@@ -1058,10 +4857,15 @@ class SciHlpApp:
         self.root.minsize(800, 600)
 
         self.main_controller = MainController(self.root)
+        self.root.protocol("WM_DELETE_WINDOW", self.close)
 
     def run(self):
         self.root.mainloop()
 
+    def close(self):
+        self.main_controller.shutdown()
+        self.root.destroy()
+
 
 
 